@@ -0,0 +1,270 @@
+"""backtest
+
+Parallel rolling-origin backtesting and SMAPE/MAE/RMSE evaluation harness.
+
+Every model is scored on the same folds: 24-hour (96-step) forecasts issued at
+a fixed list of day-aligned origins for every building. Buildings run in a
+process pool, the forecasts are gathered into (buildings x origins x 96)
+arrays and all metrics are computed on those arrays with NumPy, giving
+per-building and per-cohort score tables.
+
+Models follow a small protocol:
+
+    class Model:
+        def fit(self, y):
+            # y: 1-D float32 load history before the first origin
+            ...
+        def predict(self, history, horizon):
+            # history: 1-D load up to the origin; returns `horizon` values
+            ...
+
+Models are created per building by a picklable `model_factory` callable
+(a class works), so nothing is shared across buildings. A factory with a true
+`per_building` attribute is called with the building id instead, for models
+that carry per-building state such as persisted parameters
+(sarimax_pool.SarimaxParamFactory).
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from persistence import smape
+
+PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
+PROCESSED_PATH = PATH_INTERNAL + "/processed_weather_and_load"
+
+TARGET_COLUMN = 'out.electricity.total.energy_consumption'
+HORIZON = 96
+STEPS_PER_DAY = 96
+
+
+class PersistenceModel():
+    """
+    Reference persistence model implementing the backtest protocol.
+
+    Parameters
+    ----------
+    lag_days : int
+        1 repeats the prior 24 hours, 7 repeats the same weekday last week.
+    """
+    def __init__(self, lag_days=1):
+        self.lag_days = lag_days
+
+    def fit(self, y):
+        return self
+
+    def predict(self, history, horizon=HORIZON):
+        lag = self.lag_days * STEPS_PER_DAY
+        if len(history) < lag:
+            return np.full(horizon, np.nan, dtype=np.float32)
+        window = np.asarray(history[len(history) - lag:], dtype=np.float32)
+        return np.resize(window, horizon)
+
+
+def read_load_series(building_id, directory=PROCESSED_PATH, column=TARGET_COLUMN):
+    """
+    Reads only the load column of a processed building file.
+    """
+    df = pd.read_csv(os.path.join(directory, f"{building_id}.csv"), usecols=[column])
+    return df[column].to_numpy(dtype=np.float32)
+
+
+def make_origins(n_steps, first_day=28, every_days=7, horizon=HORIZON, steps_per_day=STEPS_PER_DAY):
+    """
+    Returns day-aligned forecast origins (sample positions) for a series length.
+
+    Parameters
+    ----------
+    n_steps : int
+        Length of the load series.
+    first_day : int
+        Day of the first origin; the days before it are the initial training window.
+    every_days : int
+        Days between consecutive origins.
+    horizon : int
+        Forecast length; origins without a full horizon are dropped.
+
+    Returns
+    -------
+    np.ndarray
+        int64 positions; the forecast at origin o covers y[o:o + horizon].
+    """
+    origins = np.arange(first_day * steps_per_day, n_steps - horizon + 1, every_days * steps_per_day)
+    return origins.astype(np.int64)
+
+
+def _new_model(model_factory, building_id):
+    if getattr(model_factory, 'per_building', False):
+        return model_factory(building_id)
+    return model_factory()
+
+
+def backtest_building(building_id, model_factory, read_fn, origins, horizon=HORIZON, refit=False):
+    """
+    Runs the rolling-origin forecasts of one building.
+
+    Never raises; a failing building returns all-NaN forecasts and the error.
+
+    Returns
+    -------
+    tuple
+        (actual, predicted, error) with arrays of shape (origins, horizon).
+    """
+    actual = np.full((len(origins), horizon), np.nan, dtype=np.float32)
+    predicted = np.full((len(origins), horizon), np.nan, dtype=np.float32)
+    try:
+        y = np.asarray(read_fn(building_id), dtype=np.float32)
+        model = _new_model(model_factory, building_id)
+        if not refit:
+            model.fit(y[:origins[0]])
+        for i, origin in enumerate(origins):
+            if origin + horizon > len(y):
+                break
+            if refit:
+                model = _new_model(model_factory, building_id)
+                model.fit(y[:origin])
+            actual[i] = y[origin:origin + horizon]
+            predicted[i] = np.asarray(model.predict(y[:origin], horizon), dtype=np.float32)[:horizon]
+        return actual, predicted, None
+    except Exception as e:
+        return actual, predicted, f"{type(e).__name__}: {e}"
+
+
+def _run_one(args):
+    return backtest_building(*args)
+
+
+def metrics(actual, predicted, axis=None):
+    """
+    SMAPE, MAE and RMSE over the given axes, ignoring NaN forecasts.
+
+    Returns
+    -------
+    dict
+        {'smape': ..., 'mae': ..., 'rmse': ...}
+    """
+    actual = np.asarray(actual, dtype=np.float64)
+    predicted = np.asarray(predicted, dtype=np.float64)
+    error = predicted - actual
+    with warnings.catch_warnings():
+        # buildings that failed entirely score NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return {
+            'smape': smape(actual, predicted, axis=axis),
+            'mae': np.nanmean(np.abs(error), axis=axis),
+            'rmse': np.sqrt(np.nanmean(error * error, axis=axis)),
+        }
+
+
+class BacktestResult():
+    """
+    Forecasts of one model on one set of folds.
+
+    Attributes
+    ----------
+    building_ids : list
+    origins : np.ndarray
+    actual, predicted : np.ndarray
+        Arrays of shape (buildings, origins, horizon).
+    errors : dict
+        {building_id: error message} for buildings that failed.
+    """
+    def __init__(self, building_ids, origins, actual, predicted, errors):
+        self.building_ids = list(building_ids)
+        self.origins = origins
+        self.actual = actual
+        self.predicted = predicted
+        self.errors = errors
+
+    def overall(self):
+        return {name: float(value) for name, value in metrics(self.actual, self.predicted).items()}
+
+    def building_scores(self):
+        """
+        Returns one row per building with its SMAPE, MAE and RMSE.
+        """
+        scores = metrics(self.actual, self.predicted, axis=(1, 2))
+        table = pd.DataFrame(scores, index=pd.Index(self.building_ids, name='bldg_id'))
+        table['n_origins'] = (~np.isnan(self.predicted).all(axis=2)).sum(axis=1)
+        return table
+
+    def cohort_scores(self, cohorts):
+        """
+        Returns one row per cohort, pooling the errors of its buildings.
+
+        Parameters
+        ----------
+        cohorts : dict or pd.Series
+            Maps building id to a cohort label (e.g. building type or
+            climate zone); buildings without a label are left out.
+
+        Returns
+        -------
+        pd.DataFrame
+        """
+        lookup = {str(b): label for b, label in dict(cohorts).items()}
+        labels = pd.Series([lookup.get(str(b)) for b in self.building_ids])
+        rows = {}
+        for label, index in labels.groupby(labels).groups.items():
+            index = np.asarray(index)
+            row = {name: float(value) for name, value in
+                   metrics(self.actual[index], self.predicted[index]).items()}
+            row['n_buildings'] = len(index)
+            rows[label] = row
+        return pd.DataFrame.from_dict(rows, orient='index').rename_axis('cohort')
+
+
+def run_backtest(building_ids, model_factory, read_fn=read_load_series, origins=None,
+                 n_steps=35040, horizon=HORIZON, refit=False, max_workers=None, verbose=True):
+    """
+    Backtests a model across many buildings in a process pool.
+
+    Parameters
+    ----------
+    building_ids : list
+        Buildings to evaluate, e.g. the test ids of a split JSON.
+    model_factory : callable
+        Picklable callable returning a fresh model, or taking the building
+        id if it has per_building set (see module docstring).
+    read_fn : callable
+        Picklable callable mapping a building id to its 1-D load series.
+    origins : np.ndarray, optional
+        Forecast origins. Defaults to make_origins(n_steps), so every model
+        run with the same arguments is scored on identical folds.
+    n_steps : int
+        Series length used for the default origins.
+    horizon : int
+        Forecast length.
+    refit : bool
+        Refit the model at every origin instead of once before the first.
+    max_workers : int, optional
+        Worker processes; 1 runs in this process.
+
+    Returns
+    -------
+    BacktestResult
+    """
+    building_ids = list(building_ids)
+    if origins is None:
+        origins = make_origins(n_steps, horizon=horizon)
+    jobs = [(b, model_factory, read_fn, origins, horizon, refit) for b in building_ids]
+
+    if max_workers == 1:
+        results = [_run_one(job) for job in jobs]
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        chunksize = max(1, len(jobs) // (max_workers * 8))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_run_one, jobs, chunksize=chunksize))
+
+    actual = np.stack([r[0] for r in results]) if results else np.empty((0, len(origins), horizon), np.float32)
+    predicted = np.stack([r[1] for r in results]) if results else np.empty_like(actual)
+    errors = {b: r[2] for b, r in zip(building_ids, results) if r[2] is not None}
+    if verbose:
+        for building_id, error in errors.items():
+            print(f"Error backtesting building {building_id}: {error}")
+    return BacktestResult(building_ids, origins, actual, predicted, errors)
@@ -0,0 +1,268 @@
+"""benchmark
+
+Timing and memory benchmark of the preprocessing stages of
+Utils.match_l_and_w_from_building_id and Utils.fourier_encoding, run on a
+synthetic ComStock tree (synthetic_data.generate_fleet) at several fleet
+sizes.
+
+Stages, per building, in pipeline order:
+    csv_read               pd.read_csv of load.csv and weather.csv
+    datetime_conversion    pd.to_datetime of 'timestamp' and 'date_time'
+    weather_interpolation  hourly -> 15-minute resample + linear interpolation
+    heat_index             weather_kernel.heat_index
+    merge                  inner join of load and weather on 'timestamp'
+    calendar_features      calendar_features.calendar_features_for
+    hourly_rollups         rollups.add_rollup_features
+    fourier                spectral.spectral_features of the building's load
+
+Wall times are taken over every building of each fleet size. Memory (the
+tracemalloc peak of each stage) is measured in a separate pass over the first
+few buildings only, because tracing slows the stages down.
+
+Results are saved as JSON; compare_results flags stages that got slower
+between two result files.
+
+Usage:
+    python benchmark.py --root /tmp/comstock --sizes 1 100 10000 --output benchmark.json
+A full ComStock year takes about 1.7 MB of CSV per building, so the 10k
+fleet needs about 17 GB of disk; --days shortens the year.
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from calendar_features import calendar_features_for
+from rollups import add_rollup_features
+from spectral import spectral_features
+from synthetic_data import generate_fleet
+from weather_kernel import heat_index
+
+STAGES = ['csv_read', 'datetime_conversion', 'weather_interpolation', 'heat_index',
+          'merge', 'calendar_features', 'hourly_rollups', 'fourier']
+SIZES = [1, 100, 10000]
+
+
+class StageRecorder():
+    """
+    Collects per-stage wall times (and optionally tracemalloc peaks) of one run.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = {stage: [] for stage in STAGES}
+        self.peak_mb = {stage: [] for stage in STAGES}
+        self.rows = {stage: [] for stage in STAGES}
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = {}
+        yield result
+        self.seconds[name].append(time.perf_counter() - start)
+        if self.trace_memory:
+            self.peak_mb[name].append((tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20)
+        if 'rows' in result:
+            self.rows[name].append(result['rows'])
+
+
+def run_stages(building_path, building_id, recorder):
+    """
+    Runs the preprocessing stages of one building, recording each of them.
+    """
+    building_dir = os.path.join(building_path, str(building_id))
+
+    with recorder.stage('csv_read') as stage:
+        load = pd.read_csv(os.path.join(building_dir, 'load.csv'))
+        weather = pd.read_csv(os.path.join(building_dir, 'weather.csv'))
+        stage['rows'] = len(load) + len(weather)
+
+    with recorder.stage('datetime_conversion') as stage:
+        load['timestamp'] = pd.to_datetime(load['timestamp'])
+        weather['date_time'] = pd.to_datetime(weather['date_time'])
+        stage['rows'] = len(load) + len(weather)
+
+    with recorder.stage('weather_interpolation') as stage:
+        weather = weather.set_index('date_time').resample('15min').asfreq().interpolate(method='linear')
+        weather = weather.reset_index().rename(columns={'date_time': 'timestamp'})
+        stage['rows'] = len(weather)
+
+    with recorder.stage('heat_index') as stage:
+        weather['heat_index'] = heat_index(weather['Dry Bulb Temperature [°C]'].values,
+                                           weather['Relative Humidity [%]'].values)
+        stage['rows'] = len(weather)
+
+    with recorder.stage('merge') as stage:
+        merged = pd.merge(load[['timestamp', 'out.electricity.total.energy_consumption']],
+                          weather[['timestamp', 'Dry Bulb Temperature [°C]', 'Relative Humidity [%]', 'heat_index']],
+                          on='timestamp', how='inner')
+        stage['rows'] = len(merged)
+
+    with recorder.stage('calendar_features') as stage:
+        features = calendar_features_for(merged['timestamp'])
+        for feature in ['hour', 'day', 'month', 'year', 'is_weekday', 'is_holiday']:
+            merged[feature] = features[feature].values
+        stage['rows'] = len(merged)
+
+    with recorder.stage('hourly_rollups') as stage:
+        merged = add_rollup_features(merged, 'timestamp')
+        stage['rows'] = len(merged)
+
+    with recorder.stage('fourier') as stage:
+        spectral_features([load['out.electricity.total.energy_consumption'].values])
+        stage['rows'] = len(load)
+
+
+def _summary(recorder):
+    stages = {}
+    for stage in STAGES:
+        seconds = np.asarray(recorder.seconds[stage])
+        stages[stage] = {
+            'total_s': round(float(seconds.sum()), 4),
+            'mean_ms': round(float(seconds.mean()) * 1000, 3),
+            'p50_ms': round(float(np.percentile(seconds, 50)) * 1000, 3),
+            'p99_ms': round(float(np.percentile(seconds, 99)) * 1000, 3),
+            'max_ms': round(float(seconds.max()) * 1000, 3),
+            'rows_per_building': int(np.mean(recorder.rows[stage])) if recorder.rows[stage] else None,
+        }
+    return stages
+
+
+def benchmark_size(root, n_buildings, memory_sample=3, verbose=True):
+    """
+    Times every stage over the first n_buildings buildings of a synthetic tree.
+
+    Returns
+    -------
+    dict
+        Per-stage timing summary, memory peaks and throughput.
+    """
+    building_path = os.path.join(root, 'building_data')
+    building_ids = list(range(1, n_buildings + 1))
+
+    recorder = StageRecorder()
+    failed = []
+    start = time.perf_counter()
+    for building_id in building_ids:
+        try:
+            run_stages(building_path, building_id, recorder)
+        except Exception as e:
+            failed.append(building_id)
+            print(f"Error benchmarking building {building_id}: {e}")
+    elapsed = time.perf_counter() - start
+    stages = _summary(recorder)
+
+    memory = StageRecorder(trace_memory=True)
+    tracemalloc.start()
+    try:
+        for building_id in building_ids[:memory_sample]:
+            run_stages(building_path, building_id, memory)
+    finally:
+        tracemalloc.stop()
+    for stage in STAGES:
+        stages[stage]['peak_mb'] = round(float(np.max(memory.peak_mb[stage])), 3) if memory.peak_mb[stage] else None
+
+    result = {'n_buildings': n_buildings,
+              'failed': failed,
+              'total_s': round(elapsed, 3),
+              'buildings_per_s': round(n_buildings / elapsed, 3) if elapsed else None,
+              'stages': stages}
+    if verbose:
+        slowest = max(STAGES, key=lambda s: stages[s]['total_s'])
+        print(f"{n_buildings} buildings: {elapsed:.2f}s ({result['buildings_per_s']} buildings/s), "
+              f"slowest stage {slowest}")
+    return result
+
+
+def run_benchmark(root, sizes=SIZES, output=None, seed=0, days=365, memory_sample=3, verbose=True):
+    """
+    Generates the synthetic tree (if needed) and benchmarks each fleet size.
+
+    Parameters
+    ----------
+    root : str
+        Folder of the synthetic tree; buildings already generated are reused.
+    sizes : list
+        Fleet sizes to benchmark.
+    output : str, optional
+        JSON file to save the results to.
+    seed, days :
+        Passed to synthetic_data.generate_fleet.
+    memory_sample : int
+        Buildings profiled with tracemalloc per size.
+
+    Returns
+    -------
+    dict
+        Environment description and one result per size.
+    """
+    generate_fleet(root, max(sizes), seed=seed, days=days, verbose=verbose)
+    results = {
+        'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'numpy': np.__version__, 'pandas': pd.__version__, 'cpu_count': os.cpu_count()},
+        'config': {'seed': seed, 'days': days, 'memory_sample': memory_sample},
+        'runs': [benchmark_size(root, n, memory_sample, verbose) for n in sizes],
+    }
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        if verbose:
+            print(f"Saved benchmark results to {output}")
+    return results
+
+
+def compare_results(baseline_file, current_file, tolerance=0.2):
+    """
+    Compares the mean stage times of two result files.
+
+    Parameters
+    ----------
+    tolerance : float
+        Relative slowdown above which a stage is flagged as a regression.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per (fleet size, stage) present in both files.
+    """
+    with open(baseline_file, 'r') as f:
+        baseline = {run['n_buildings']: run for run in json.load(f)['runs']}
+    with open(current_file, 'r') as f:
+        current = {run['n_buildings']: run for run in json.load(f)['runs']}
+
+    rows = []
+    for n_buildings in sorted(set(baseline) & set(current)):
+        for stage in STAGES:
+            before = baseline[n_buildings]['stages'][stage]['mean_ms']
+            after = current[n_buildings]['stages'][stage]['mean_ms']
+            ratio = after / before if before else np.nan
+            rows.append({'n_buildings': n_buildings, 'stage': stage, 'baseline_ms': before,
+                         'current_ms': after, 'ratio': round(ratio, 3), 'regression': ratio > 1 + tolerance})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the preprocessing stages on synthetic data.")
+    parser.add_argument('--root', required=True, help="folder of the synthetic ComStock tree")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--memory-sample', type=int, default=3)
+    parser.add_argument('--baseline', help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    run_benchmark(args.root, args.sizes, args.output, args.seed, args.days, args.memory_sample)
+    if args.baseline:
+        comparison = compare_results(args.baseline, args.output)
+        print(comparison.to_string(index=False))
@@ -0,0 +1,200 @@
+"""building_store
+
+Columnar per-building store for the ComStock load.csv and weather.csv files.
+
+Every building under BUILDING_PATH is converted once into two Parquet files
+(one for load, one for weather) with typed datetime64 timestamps and float32
+values. Each file is written with one row group per calendar month, so reads
+that only need a few columns or a single month skip the CSV parser entirely
+and only decode the row groups they touch.
+
+Layout of the store:
+    <store_path>/load/<bldg_id>.parquet
+    <store_path>/weather/<bldg_id>.parquet
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Global Variables
+PATH_EXTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/[EXTERNAL] breakthrough_tech_ai_f24/data"
+PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
+BUILDING_PATH = PATH_EXTERNAL + "/building_data"
+STORE_PATH = PATH_INTERNAL + "/building_store"
+
+# name of the timestamp column in each raw file
+TIME_COLUMNS = {
+    'load': 'timestamp',
+    'weather': 'date_time',
+}
+
+
+class BuildingStore():
+    """
+    Reads and writes the per-building Parquet store.
+
+    Parameters
+    ----------
+    store_path : str
+        Root folder of the store.
+    building_path : str
+        Folder holding the raw building_data/<bldg_id>/ CSV files.
+    """
+    def __init__(self, store_path=STORE_PATH, building_path=BUILDING_PATH):
+        self.store_path = store_path
+        self.building_path = building_path
+
+    def _file(self, kind, building_id):
+        return os.path.join(self.store_path, kind, f"{building_id}.parquet")
+
+    def has_building(self, building_id):
+        """
+        Returns True if both the load and weather files of a building are stored.
+        """
+        return all(os.path.exists(self._file(kind, building_id)) for kind in TIME_COLUMNS)
+
+    def building_ids(self):
+        """
+        Lists the building ids that have a load file in the store.
+
+        Returns
+        -------
+        list
+            Sorted list of integer building ids.
+        """
+        load_dir = os.path.join(self.store_path, 'load')
+        if not os.path.isdir(load_dir):
+            return []
+        return sorted(int(f.split('.')[0]) for f in os.listdir(load_dir) if f.endswith('.parquet'))
+
+    # Conversion from CSV
+    def _write(self, df, kind, building_id):
+        time_column = TIME_COLUMNS[kind]
+        df[time_column] = pd.to_datetime(df[time_column])
+        value_columns = [c for c in df.columns if c != time_column]
+        df[value_columns] = df[value_columns].apply(pd.to_numeric, errors='coerce').astype(np.float32)
+        df = df.sort_values(time_column).reset_index(drop=True)
+
+        out_file = self._file(kind, building_id)
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        tmp_file = out_file + ".tmp"
+
+        # one row group per month so time-range reads can skip whole months
+        month = df[time_column].dt.to_period('M')
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(tmp_file, schema, compression='zstd') as writer:
+            for _, month_df in df.groupby(month, sort=True):
+                writer.write_table(pa.Table.from_pandas(month_df, schema=schema, preserve_index=False))
+        os.replace(tmp_file, out_file)
+        return out_file
+
+    def convert_building(self, building_id, overwrite=False):
+        """
+        Converts the load.csv and weather.csv of one building into the store.
+
+        Parameters
+        ----------
+        building_id : int or str
+            Building id (folder name under building_path).
+        overwrite : bool
+            Rewrite the building even if it is already stored.
+
+        Returns
+        -------
+        bool
+            True if the building was written, False if it was already stored.
+        """
+        if not overwrite and self.has_building(building_id):
+            return False
+        for kind in TIME_COLUMNS:
+            csv_file = os.path.join(self.building_path, str(building_id), f"{kind}.csv")
+            self._write(pd.read_csv(csv_file), kind, building_id)
+        return True
+
+    def convert_buildings(self, building_ids, overwrite=False):
+        """
+        One-time conversion of many buildings from CSV into the store.
+
+        Parameters
+        ----------
+        building_ids : list
+            A list of building ids.
+        overwrite : bool
+            Rewrite buildings that are already stored.
+
+        Returns
+        -------
+        list
+            The building ids that failed to convert.
+        """
+        failed = []
+        for building_id in building_ids:
+            try:
+                self.convert_building(building_id, overwrite=overwrite)
+            except FileNotFoundError:
+                print(f"Files for building {building_id} not found.")
+                failed.append(building_id)
+            except Exception as e:
+                print(f"Error converting building_id {building_id}: {e}")
+                failed.append(building_id)
+        return failed
+
+    # Reading
+    def _read(self, kind, building_id, columns=None, start=None, end=None):
+        time_column = TIME_COLUMNS[kind]
+        if columns is not None:
+            columns = [time_column] + [c for c in columns if c != time_column]
+
+        filters = []
+        if start is not None:
+            filters.append((time_column, '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append((time_column, '<', pd.Timestamp(end)))
+
+        table = pq.read_table(self._file(kind, building_id), columns=columns,
+                              filters=filters or None)
+        return table.to_pandas()
+
+    def read_load(self, building_id, columns=None, start=None, end=None):
+        """
+        Reads the load of one building from the store.
+
+        Parameters
+        ----------
+        building_id : int or str
+            Building id.
+        columns : list, optional
+            Value columns to read. The 'timestamp' column is always returned.
+        start, end : str or pd.Timestamp, optional
+            Half-open time range [start, end) to read.
+
+        Returns
+        -------
+        pd.DataFrame
+            Same columns as load.csv, with a datetime64 'timestamp' and float32 values.
+        """
+        return self._read('load', building_id, columns, start, end)
+
+    def read_weather(self, building_id, columns=None, start=None, end=None):
+        """
+        Reads the weather of one building from the store.
+
+        Parameters
+        ----------
+        building_id : int or str
+            Building id.
+        columns : list, optional
+            Value columns to read. The 'date_time' column is always returned.
+        start, end : str or pd.Timestamp, optional
+            Half-open time range [start, end) to read.
+
+        Returns
+        -------
+        pd.DataFrame
+            Same columns as weather.csv, with a datetime64 'date_time' and float32 values.
+        """
+        return self._read('weather', building_id, columns, start, end)
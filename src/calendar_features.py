@@ -0,0 +1,171 @@
+"""calendar_features
+
+Precomputed calendar feature table shared across buildings.
+
+Every ComStock building shares the same one-year 15-minute timeline, so the
+calendar features (hour, day, month, weekday and US-holiday flags, optional
+cyclic encodings) are built once per (year, timezone) and cached. Building
+frames pick up their features by grid position (an array gather) instead of
+recomputing .dt accessors, holidays.US() lookups and per-row lambdas.
+
+All integer columns are int8 except 'year' (int16); the cyclic encodings are
+float32.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+STEP = pd.Timedelta(minutes=15)
+
+INT_COLUMNS = ['hour', 'day', 'month', 'day_of_week', 'is_weekday', 'is_holiday']
+CYCLIC_COLUMNS = ['hour_sin', 'hour_cos', 'day_of_week_sin', 'day_of_week_cos']
+
+
+def build_features(timestamps, cyclic=False):
+    """
+    Computes the calendar features of arbitrary timestamps.
+
+    Parameters
+    ----------
+    timestamps : array-like of datetime64
+        Timestamps, naive or timezone-aware (features use the local wall time).
+    cyclic : bool
+        Also add sin/cos encodings of hour and day of week.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per timestamp, positionally indexed.
+    """
+    import holidays
+
+    timestamps = pd.DatetimeIndex(timestamps)
+    dates = timestamps.normalize()
+    years = range(timestamps.year.min(), timestamps.year.max() + 1)
+    us_holidays = pd.DatetimeIndex(sorted(holidays.US(years=years)))
+    if timestamps.tz is not None:
+        us_holidays = us_holidays.tz_localize(timestamps.tz)
+
+    day_of_week = timestamps.dayofweek
+    table = pd.DataFrame({
+        'hour': np.asarray(timestamps.hour, dtype=np.int8),
+        'day': np.asarray(timestamps.day, dtype=np.int8),
+        'month': np.asarray(timestamps.month, dtype=np.int8),
+        'year': np.asarray(timestamps.year, dtype=np.int16),
+        'day_of_week': np.asarray(day_of_week, dtype=np.int8),
+        'is_weekday': np.asarray(day_of_week < 5, dtype=np.int8),
+        'is_holiday': np.asarray(dates.isin(us_holidays), dtype=np.int8),
+    })
+    if cyclic:
+        hour = timestamps.hour + timestamps.minute / 60.
+        table['hour_sin'] = np.sin(2 * np.pi * hour / 24).astype(np.float32)
+        table['hour_cos'] = np.cos(2 * np.pi * hour / 24).astype(np.float32)
+        table['day_of_week_sin'] = np.sin(2 * np.pi * day_of_week / 7).astype(np.float32)
+        table['day_of_week_cos'] = np.cos(2 * np.pi * day_of_week / 7).astype(np.float32)
+    return table
+
+
+@lru_cache(maxsize=16)
+def _cached_table(year, tz, cyclic):
+    # Jan 1 00:00 through the next Jan 1 00:00 inclusive, which covers both the
+    # interval-start and the interval-end (00:15 ... 00:00) ComStock labelling
+    start = pd.Timestamp(year=year, month=1, day=1, tz=tz)
+    end = pd.Timestamp(year=year + 1, month=1, day=1, tz=tz)
+    timestamps = pd.date_range(start, end, freq=STEP)
+    table = build_features(timestamps, cyclic)
+    table.attrs['start'] = start
+    return table
+
+
+def calendar_table(year, tz=None, cyclic=False):
+    """
+    Returns the cached calendar table of one year on the 15-minute grid.
+
+    Row i holds the features of Jan 1 00:00 + i * 15 minutes (absolute time
+    for timezone-aware tables, so DST days have 92 or 100 rows).
+
+    Parameters
+    ----------
+    year : int
+        Calendar year.
+    tz : str, optional
+        Timezone name, e.g. 'US/Eastern'. None for naive local time.
+    cyclic : bool
+        Include the cyclic sin/cos encodings.
+
+    Returns
+    -------
+    pd.DataFrame
+        The shared table. Do not modify it in place.
+    """
+    return _cached_table(int(year), tz, bool(cyclic))
+
+
+def table_positions(timestamps, table):
+    """
+    Returns the row of table for each timestamp, or None if any timestamp is
+    off the 15-minute grid or outside the table.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    offsets = timestamps - table.attrs['start']
+    if (offsets % STEP != pd.Timedelta(0)).any():
+        return None
+    positions = np.asarray(offsets // STEP, dtype=np.int64)
+    if positions.min() < 0 or positions.max() >= len(table):
+        return None
+    return positions
+
+
+def calendar_features_for(timestamps, cyclic=False):
+    """
+    Looks up the calendar features of a building's timestamps by position.
+
+    Timestamps on the 15-minute grid of a single year are served from the
+    cached table; anything else (irregular or multi-year timestamps) falls
+    back to build_features.
+
+    Parameters
+    ----------
+    timestamps : array-like of datetime64
+        Timestamps of the building frame.
+    cyclic : bool
+        Include the cyclic sin/cos encodings.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per timestamp, positionally indexed.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    tz = None if timestamps.tz is None else str(timestamps.tz)
+    table = calendar_table(timestamps[0].year, tz, cyclic)
+    positions = table_positions(timestamps, table)
+    if positions is None:
+        return build_features(timestamps, cyclic)
+    return table.take(positions).reset_index(drop=True)
+
+
+def join_calendar(df, time_column='timestamp', cyclic=False):
+    """
+    Adds the calendar features to a building frame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Building frame with a datetime64 time column.
+    time_column : str
+        Name of the time column.
+    cyclic : bool
+        Include the cyclic sin/cos encodings.
+
+    Returns
+    -------
+    pd.DataFrame
+        A copy of df with the calendar columns added (replacing any existing
+        columns of the same name).
+    """
+    features = calendar_features_for(df[time_column], cyclic)
+    features.index = df.index
+    return pd.concat([df.drop(columns=features.columns, errors='ignore'), features], axis=1)
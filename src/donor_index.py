@@ -0,0 +1,229 @@
+"""donor_index
+
+Nearest-neighbour donor index for cold-start forecasts of unseen buildings.
+
+Training buildings are indexed by their standardized metadata vectors
+(metadata_store.MetadataStore.vectors over md_one_hot_encoded.csv) in a
+scikit-learn KD-tree, or a ball tree when the vectors are wide. A new building
+with metadata only is matched to its k most similar training buildings, and
+its forecast is the inverse-distance weighted average of their load profiles:
+one mean 96-interval day per day of week, optionally stored per square foot
+so donors of a different size are rescaled to the new building.
+
+When spectral signatures (spectral.spectral_features) of the training
+buildings are given, a second tree over metadata + signature is built; a
+building with a few days of history can then be queried with its own
+signature as well.
+
+The index is persisted with joblib.
+"""
+
+import numpy as np
+
+STEPS_PER_DAY = 96
+KD_TREE_MAX_DIMS = 16
+
+
+def weekday_profiles(loads, start):
+    """
+    Averages each building's load into one 96-interval day per day of week.
+
+    Parameters
+    ----------
+    loads : np.ndarray
+        Array of shape (buildings, intervals) whose first interval starts a day
+        (e.g. a FleetTensor gather of the load channel).
+    start : str or pd.Timestamp
+        Date of the first interval.
+
+    Returns
+    -------
+    np.ndarray
+        float32 array of shape (buildings, 7, 96), Monday first. Days of week
+        with no data are NaN.
+    """
+    import pandas as pd
+
+    loads = np.asarray(loads, dtype=np.float64)
+    n_days = loads.shape[1] // STEPS_PER_DAY
+    days = loads[:, :n_days * STEPS_PER_DAY].reshape(len(loads), n_days, STEPS_PER_DAY)
+    day_of_week = pd.date_range(pd.Timestamp(start).normalize(), periods=n_days, freq='D').dayofweek
+    profiles = np.full((len(loads), 7, STEPS_PER_DAY), np.nan, dtype=np.float32)
+    for dow in range(7):
+        selected = days[:, day_of_week == dow]
+        if selected.shape[1]:
+            valid = ~np.isnan(selected)
+            count = valid.sum(axis=1)
+            total = np.where(valid, selected, 0.).sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                profiles[:, dow] = np.where(count > 0, total / count, np.nan)
+    return profiles
+
+
+class _Scaler():
+    # column standardization that ignores constant columns
+    def __init__(self, matrix):
+        self.mean = np.nanmean(matrix, axis=0)
+        std = np.nanstd(matrix, axis=0)
+        self.std = np.where(std > 0, std, 1.)
+
+    def transform(self, matrix):
+        return np.nan_to_num((matrix - self.mean) / self.std)
+
+
+def _tree(matrix, leaf_size):
+    from sklearn.neighbors import BallTree, KDTree
+
+    if matrix.shape[1] <= KD_TREE_MAX_DIMS:
+        return KDTree(matrix, leaf_size=leaf_size)
+    return BallTree(matrix, leaf_size=leaf_size)
+
+
+class DonorIndex():
+    """
+    Similarity index of training buildings with their donor load profiles.
+
+    Parameters
+    ----------
+    building_ids : list
+        Training buildings.
+    md_vectors : np.ndarray
+        Metadata vectors of shape (buildings, columns).
+    profiles : np.ndarray
+        Donor profiles of shape (buildings, 7, 96), see weekday_profiles.
+    md_columns : list, optional
+        Names of the metadata columns; needed for scale_column.
+    scale_column : str, optional
+        Metadata column (e.g. 'in.sqft') the profiles are divided by, so the
+        forecast of a new building is rescaled by its own value.
+    signatures : np.ndarray, optional
+        Spectral signatures of shape (buildings, features).
+    signature_weight : float
+        Relative weight of the signature block against the metadata block.
+    leaf_size : int
+        Leaf size of the trees.
+    """
+    def __init__(self, building_ids, md_vectors, profiles, md_columns=None, scale_column=None,
+                 signatures=None, signature_weight=1., leaf_size=40):
+        md_vectors = np.asarray(md_vectors, dtype=np.float64)
+        self.building_ids = np.asarray([str(b) for b in building_ids])
+        self.md_columns = None if md_columns is None else list(md_columns)
+
+        self.scale_index = None
+        profiles = np.asarray(profiles, dtype=np.float32)
+        if scale_column is not None:
+            self.scale_index = self.md_columns.index(scale_column)
+            scale = md_vectors[:, self.scale_index]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                profiles = profiles / np.where(scale > 0, scale, np.nan)[:, None, None]
+        self.profiles = profiles
+
+        self.md_scaler = _Scaler(md_vectors)
+        self.md_tree = _tree(self.md_scaler.transform(md_vectors), leaf_size)
+
+        self.signature_scaler = None
+        self.combined_tree = None
+        if signatures is not None:
+            signatures = np.asarray(signatures, dtype=np.float64)
+            self.signature_scaler = _Scaler(signatures)
+            # balance the blocks so the wider one does not dominate the distance
+            self.signature_factor = signature_weight * np.sqrt(md_vectors.shape[1] / signatures.shape[1])
+            self.combined_tree = _tree(self._combined(md_vectors, signatures), leaf_size)
+
+    @classmethod
+    def from_fleet(cls, metadata, tensor, building_ids, scale_column=None, signatures=None, **kwargs):
+        """
+        Builds the index from a MetadataStore and a fleet_tensor.FleetTensor.
+        """
+        from fleet_tensor import CHANNELS
+
+        building_ids = [str(b) for b in building_ids]
+        loads = tensor.gather(building_ids, CHANNELS[0])
+        start = tensor.start if tensor.start is not None else '2018-01-01'
+        return cls(building_ids, metadata.vectors(building_ids), weekday_profiles(loads, start),
+                   md_columns=metadata.columns, scale_column=scale_column, signatures=signatures,
+                   **kwargs)
+
+    def _combined(self, md_vectors, signatures):
+        return np.hstack([self.md_scaler.transform(md_vectors),
+                          self.signature_scaler.transform(signatures) * self.signature_factor])
+
+    # Persistence
+    def save(self, path):
+        import joblib
+
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        import joblib
+
+        return joblib.load(path)
+
+    # Queries
+    def query(self, md_vectors, k=5, signatures=None):
+        """
+        Finds the k most similar training buildings.
+
+        Parameters
+        ----------
+        md_vectors : np.ndarray
+            Metadata vectors of the new buildings, shape (queries, columns) or
+            (columns,).
+        k : int
+            Number of donors.
+        signatures : np.ndarray, optional
+            Spectral signatures of the new buildings; uses the combined tree.
+
+        Returns
+        -------
+        tuple
+            (donor ids, distances, weights, donor rows), each of shape
+            (queries, k); weights are inverse-distance and sum to 1 per row.
+        """
+        md_vectors = np.atleast_2d(np.asarray(md_vectors, dtype=np.float64))
+        k = min(k, len(self.building_ids))
+        if signatures is not None:
+            if self.combined_tree is None:
+                raise ValueError("The index was built without spectral signatures.")
+            signatures = np.atleast_2d(np.asarray(signatures, dtype=np.float64))
+            distances, rows = self.combined_tree.query(self._combined(md_vectors, signatures), k=k)
+        else:
+            distances, rows = self.md_tree.query(self.md_scaler.transform(md_vectors), k=k)
+        weights = 1. / (distances + 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return self.building_ids[rows], distances, weights, rows
+
+    def forecast(self, md_vectors, day_of_week, k=5, signatures=None):
+        """
+        Returns the weighted donor load-profile forecast of one day.
+
+        Parameters
+        ----------
+        md_vectors : np.ndarray
+            Metadata vectors of the new buildings, shape (queries, columns).
+        day_of_week : int or array-like
+            Day of week to forecast (Monday = 0), one or one per query.
+        k : int
+            Number of donors.
+        signatures : np.ndarray, optional
+            Spectral signatures of the new buildings.
+
+        Returns
+        -------
+        np.ndarray
+            float32 array of shape (queries, 96); NaN where no donor has data.
+        """
+        md_vectors = np.atleast_2d(np.asarray(md_vectors, dtype=np.float64))
+        _, _, weights, rows = self.query(md_vectors, k, signatures)
+        day_of_week = np.broadcast_to(np.asarray(day_of_week, dtype=np.int64), (len(md_vectors),))
+        donor_days = self.profiles[rows, day_of_week[:, None]]  # (queries, k, 96)
+
+        # renormalize the weights over donors that have data at each interval
+        valid = ~np.isnan(donor_days)
+        w = np.where(valid, weights[:, :, None], 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            forecast = (np.where(valid, donor_days, 0.) * w).sum(axis=1) / w.sum(axis=1)
+        if self.scale_index is not None:
+            forecast = forecast * md_vectors[:, self.scale_index, None]
+        return forecast.astype(np.float32)
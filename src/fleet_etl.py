@@ -0,0 +1,254 @@
+"""fleet_etl
+
+Parallel, resumable batch ETL for the processed_weather_and_load/ folder.
+
+Buildings are fanned out to a process pool. Every finished building appends one
+line to an on-disk JSON-lines manifest (building id, status, output checksum,
+duration, error), so a rerun after a dead Colab session skips the buildings
+that already completed and only retries the failures.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+MANIFEST_NAME = "_manifest.jsonl"
+
+# manifest statuses
+DONE = 'done'
+MISSING = 'missing'  # process_fn returned None (e.g. files not found)
+FAILED = 'failed'
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """
+    Returns the sha256 hex digest of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest():
+    """
+    Append-only JSON-lines record of per-building ETL outcomes.
+
+    The last line written for a building wins, so retries simply append a new
+    entry. Lines are flushed as they are written, which keeps the manifest
+    consistent up to the last finished building if the process is killed.
+
+    Parameters
+    ----------
+    path : str
+        Location of the manifest file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a line cut off by a crash mid-write
+                        continue
+                    self.entries[str(entry['bldg_id'])] = entry
+
+    def record(self, entry):
+        self.entries[str(entry['bldg_id'])] = entry
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def status(self, building_id):
+        entry = self.entries.get(str(building_id))
+        return None if entry is None else entry['status']
+
+    def summary(self):
+        """
+        Returns a dictionary of {status: count}.
+        """
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry['status']] = counts.get(entry['status'], 0) + 1
+        return counts
+
+    def counter_totals(self, building_ids=None):
+        """
+        Sums the per-building counters (see run_fleet_etl's counters_fn).
+        """
+        totals = {}
+        for building_id, entry in self.entries.items():
+            if building_ids is not None and building_id not in building_ids:
+                continue
+            for name, value in (entry.get('counters') or {}).items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+def _output_file(output_dir, building_id):
+    return os.path.join(output_dir, f"{building_id}.csv")
+
+
+# per-worker state, installed once by the pool initializer so process_fn (and
+# anything it holds, like a weather cache) lives for the whole run
+_WORKER_FN = None
+_WORKER_COUNTERS = None
+
+
+def _init_worker(process_fn, counters_fn):
+    global _WORKER_FN, _WORKER_COUNTERS
+    _WORKER_FN = process_fn
+    _WORKER_COUNTERS = counters_fn
+
+
+def _process_in_worker(building_id, output_dir):
+    return process_building(building_id, _WORKER_FN, output_dir, _WORKER_COUNTERS)
+
+
+def process_building(building_id, process_fn, output_dir, counters_fn=None):
+    """
+    Runs process_fn for one building and writes its frame to output_dir.
+
+    Runs inside the worker processes and never raises, so a single bad building
+    cannot take down the pool.
+
+    Parameters
+    ----------
+    counters_fn : callable, optional
+        Returns a dict of running counters (e.g. weather cache hits); the
+        entry records how much each one grew during this building.
+
+    Returns
+    -------
+    dict
+        Manifest entry for the building.
+    """
+    start = time.perf_counter()
+    entry = {'bldg_id': building_id, 'status': FAILED, 'checksum': None,
+             'duration_s': None, 'error': None}
+    before = counters_fn() if counters_fn is not None else None
+    try:
+        merged_match = process_fn(building_id)
+        if merged_match is None:
+            entry['status'] = MISSING
+        else:
+            out_file = _output_file(output_dir, building_id)
+            tmp_file = out_file + ".tmp"
+            merged_match.to_csv(tmp_file)
+            os.replace(tmp_file, out_file)
+            entry['checksum'] = file_checksum(out_file)
+            entry['status'] = DONE
+    except Exception as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+    entry['duration_s'] = round(time.perf_counter() - start, 3)
+    if before is not None:
+        after = counters_fn()
+        entry['counters'] = {name: after[name] - before.get(name, 0) for name in after}
+    return entry
+
+
+def pending_building_ids(building_ids, manifest, output_dir, retry_missing=False):
+    """
+    Filters out the buildings the manifest already records as finished.
+
+    A building counts as finished if it is marked done and its output file still
+    exists. Buildings marked missing are skipped unless retry_missing is set.
+    """
+    pending = []
+    for building_id in building_ids:
+        status = manifest.status(building_id)
+        if status == DONE and os.path.exists(_output_file(output_dir, building_id)):
+            continue
+        if status == MISSING and not retry_missing:
+            continue
+        pending.append(building_id)
+    return pending
+
+
+def run_fleet_etl(building_ids, process_fn, output_dir, manifest_path=None,
+                  max_workers=None, retry_missing=False, counters_fn=None, verbose=True):
+    """
+    Processes many buildings in parallel, resuming from the manifest.
+
+    Parameters
+    ----------
+    building_ids : list
+        A list of building ids.
+    process_fn : callable
+        Picklable callable mapping a building id to a DataFrame (or None when
+        the building has no data), e.g. Utils().match_l_and_w_from_building_id.
+        It is sent to each worker once, so state it holds (a weather cache)
+        is kept across that worker's buildings.
+    output_dir : str
+        Folder the per-building CSV files are written to.
+    manifest_path : str, optional
+        Manifest location. Defaults to output_dir/_manifest.jsonl.
+    max_workers : int, optional
+        Number of worker processes. Defaults to os.cpu_count().
+    retry_missing : bool
+        Also retry buildings previously recorded as missing.
+    counters_fn : callable, optional
+        Picklable callable returning a dict of running counters of the
+        worker's process_fn state (e.g. Utils.etl_counters); the growth per
+        building is stored in its manifest entry under 'counters'.
+    verbose : bool
+        Print progress and the failures as they come in.
+
+    Returns
+    -------
+    Manifest
+        The manifest after the run.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_dir, MANIFEST_NAME))
+    pending = pending_building_ids(building_ids, manifest, output_dir, retry_missing)
+    if verbose:
+        print(f"{len(building_ids) - len(pending)} buildings already processed, {len(pending)} to go")
+    if not pending:
+        return manifest
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # keep a bounded number of buildings in flight so results are recorded
+    # as soon as they finish instead of in submission order
+    window = max_workers * 4
+    todo = iter(pending)
+    finished = 0
+    # process_fn and counters_fn are pickled together, so they keep sharing
+    # the objects they both hold
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(process_fn, counters_fn)) as executor:
+        in_flight = set()
+        for building_id in todo:
+            in_flight.add(executor.submit(_process_in_worker, building_id, output_dir))
+            if len(in_flight) >= window:
+                break
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                entry = future.result()
+                manifest.record(entry)
+                finished += 1
+                if verbose and entry['status'] == FAILED:
+                    print(f"Error processing building_id {entry['bldg_id']}: {entry['error']}")
+                if verbose and finished % 1000 == 0:
+                    print(f"{finished}/{len(pending)} buildings processed")
+            for building_id in todo:
+                in_flight.add(executor.submit(_process_in_worker, building_id, output_dir))
+                if len(in_flight) >= window:
+                    break
+
+    if verbose:
+        print(f"Finished: {manifest.summary()}")
+        if counters_fn is not None:
+            print(f"Counters of this run: {manifest.counter_totals(set(pending))}")
+    return manifest
@@ -0,0 +1,197 @@
+"""fleet_tensor
+
+Memory-mapped fleet tensor shared by multi-process training and evaluation.
+
+The processed frames of a split (the output of
+Utils.match_l_and_w_from_building_id, or the processed_weather_and_load/ CSVs)
+are packed once into a single float32 .npy file of shape
+(buildings x 35040 intervals x channels), next to a JSON index of building id
+-> offset. Every worker process attaches to the same file with a read-only
+memory map, so the operating system keeps one resident copy of the data no
+matter how many workers run. A FleetTensor pickles as its path only, so
+passing it to a ProcessPoolExecutor re-attaches in the worker instead of
+copying the array.
+"""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+N_INTERVALS = 35040
+STEP = pd.Timedelta(minutes=15)
+CHANNELS = ['out.electricity.total.energy_consumption',
+            'Dry Bulb Temperature [°C]',
+            'Relative Humidity [%]',
+            'heat_index']
+
+
+def _paths(path):
+    return path + ".npy", path + ".json"
+
+
+def _fill_building(args):
+    # runs in the worker processes: writes one building straight into the memmap
+    array_file, offset, building_id, process_fn, channels, start = args
+    try:
+        df = process_fn(building_id)
+        if df is None:
+            return building_id, False, "no data"
+        missing = [c for c in channels if c not in df.columns]
+        if missing:
+            return building_id, False, f"missing channels {missing}"
+
+        tensor = np.load(array_file, mmap_mode='r+')
+        n_intervals = tensor.shape[1]
+        values = df[channels].to_numpy(dtype=np.float32)
+        if start is not None and 'timestamp' in df.columns:
+            # place rows by time so gaps stay NaN instead of shifting the series
+            positions = np.asarray((pd.to_datetime(df['timestamp']) - start) // STEP, dtype=np.int64)
+            keep = (positions >= 0) & (positions < n_intervals)
+            tensor[offset, positions[keep]] = values[keep]
+        elif len(values) == n_intervals:
+            tensor[offset] = values
+        else:
+            # without timestamps a short frame (a gap left by the inner merge)
+            # would shift the rest of the year
+            return building_id, False, (f"{len(values)} rows for {n_intervals} intervals "
+                                        "and no timestamps to place them by")
+        tensor.flush()
+        del tensor
+        return building_id, True, None
+    except Exception as e:
+        return building_id, False, f"{type(e).__name__}: {e}"
+
+
+def build_fleet_tensor(building_ids, process_fn, path, channels=CHANNELS, n_intervals=N_INTERVALS,
+                       start=None, max_workers=None, verbose=True):
+    """
+    Packs the processed frames of many buildings into one memory-mapped tensor.
+
+    Parameters
+    ----------
+    building_ids : list
+        Buildings of the split, in the order they should be stored.
+    process_fn : callable
+        Picklable callable mapping a building id to its processed frame, e.g.
+        functools.partial(Utils().match_l_and_w_from_building_id,
+        keep_timestamp=True) with start='2018-01-01 00:15', or
+        streaming_loader.read_processed_building for complete processed files.
+    path : str
+        Output path without extension; writes path.npy and path.json.
+    channels : list
+        Frame columns to store, in channel order.
+    n_intervals : int
+        Intervals per building.
+    start : str or pd.Timestamp, optional
+        Timestamp of interval 0. If given, frames with a 'timestamp' column
+        are placed by time and unfilled intervals are NaN. Otherwise rows are
+        placed in order from interval 0, which is only safe for a complete
+        series: frames without timestamps (Utils drops them) that do not have
+        exactly n_intervals rows are marked invalid.
+    max_workers : int, optional
+        Worker processes. Defaults to os.cpu_count().
+
+    Returns
+    -------
+    FleetTensor
+        The tensor, attached read-only.
+    """
+    building_ids = [str(b) for b in building_ids]
+    array_file, index_file = _paths(path)
+    os.makedirs(os.path.dirname(os.path.abspath(array_file)), exist_ok=True)
+    tensor = np.lib.format.open_memmap(array_file, mode='w+', dtype=np.float32,
+                                       shape=(len(building_ids), n_intervals, len(channels)))
+    tensor[:] = np.nan
+    tensor.flush()
+    del tensor
+
+    start = None if start is None else pd.Timestamp(start)
+    jobs = [(array_file, i, b, process_fn, list(channels), start) for i, b in enumerate(building_ids)]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+        results = list(executor.map(_fill_building, jobs, chunksize=max(1, len(jobs) // 256)))
+
+    valid = {}
+    for building_id, ok, error in results:
+        valid[building_id] = ok
+        if verbose and not ok:
+            print(f"Error packing building {building_id}: {error}")
+
+    index = {'building_ids': building_ids,
+             'channels': list(channels),
+             'n_intervals': n_intervals,
+             'start': None if start is None else str(start),
+             'valid': [valid[b] for b in building_ids]}
+    with open(index_file, 'w') as f:
+        json.dump(index, f)
+    if verbose:
+        print(f"Packed {sum(index['valid'])}/{len(building_ids)} buildings into {array_file}")
+    return FleetTensor(path)
+
+
+class FleetTensor():
+    """
+    Read-only, zero-copy view of a fleet tensor built by build_fleet_tensor.
+
+    Parameters
+    ----------
+    path : str
+        Path given to build_fleet_tensor (without extension).
+    """
+    def __init__(self, path):
+        self.path = path
+        array_file, index_file = _paths(path)
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+        self.building_ids = index['building_ids']
+        self.channels = index['channels']
+        self.n_intervals = index['n_intervals']
+        self.start = None if index['start'] is None else pd.Timestamp(index['start'])
+        self.valid = np.asarray(index['valid'], dtype=bool)
+        self.offset_of = {b: i for i, b in enumerate(self.building_ids)}
+        self.data = np.load(array_file, mmap_mode='r')
+
+    # pickle as the path only so workers attach to the shared file
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def offset(self, building_id):
+        return self.offset_of[str(building_id).split('.')[0]]
+
+    def channel(self, name):
+        return self.channels.index(name)
+
+    def building(self, building_id, channels=None):
+        """
+        Returns one building as an (intervals x channels) view, no copy.
+        """
+        view = self.data[self.offset(building_id)]
+        if channels is None:
+            return view
+        return view[:, [self.channel(c) for c in channels]]
+
+    def series(self, building_id, channel=CHANNELS[0]):
+        """
+        Returns one channel of one building as a 1-D view, no copy.
+
+        Works as a read_fn for backtest.run_backtest and sarimax_pool.fit_fleet.
+        """
+        return self.data[self.offset(building_id), :, self.channel(channel)]
+
+    def gather(self, building_ids, channel=None):
+        """
+        Copies the given buildings (optionally one channel) into a new array.
+        """
+        offsets = [self.offset(b) for b in building_ids]
+        if channel is None:
+            return self.data[offsets]
+        return self.data[offsets, :, self.channel(channel)]
@@ -0,0 +1,326 @@
+"""forecast_server
+
+Local low-latency 24-hour forecast service for the V2X optimizer.
+
+    - trained model artifacts are loaded once with joblib (memory-mapped where
+      the artifact allows it) and kept in an LRU model cache
+    - concurrent per-building requests are queued and coalesced into
+      micro-batches, so each model sees one vectorized predict() call per batch
+    - p50/p99 latency and throughput counters are exposed at /metrics
+    - buildings without a usable model, without enough history, whose
+      history or features fail, or whose model forecast is not finite get
+      the persistence forecast (the prior 24 hours)
+
+Models take a feature matrix (one row per building) and return a
+(buildings x 96) forecast matrix. The default features are the last 96 loads,
+most recent first (shift_1 ... shift_96, as in lag_features), followed by the
+building's metadata vector when a metadata store is given.
+
+Run with:
+    service = ForecastService("models/", history_fn=tensor.series)
+    create_app(service).run(threaded=True)
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+HORIZON = 96
+N_LAGS = 96
+
+
+def persistence_forecast(history, horizon=HORIZON):
+    """
+    Repeats the prior 24 hours; None without a full, gap-free day of history.
+    """
+    if history is None or len(history) < HORIZON:
+        return None
+    last_day = np.asarray(history[len(history) - HORIZON:], dtype=np.float32)
+    if np.isnan(last_day).any():
+        return None
+    return np.resize(last_day, horizon)
+
+
+class ModelCache():
+    """
+    LRU cache of model artifacts stored as <model_dir>/<name>.joblib.
+
+    Parameters
+    ----------
+    model_dir : str
+        Folder of the artifacts.
+    max_models : int
+        Number of models kept loaded.
+    """
+    def __init__(self, model_dir, max_models=8):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'loads': 0, 'missing': 0}
+
+    def get(self, name):
+        """
+        Returns the loaded model, or None if there is no artifact for it.
+        """
+        import joblib
+
+        with self._lock:
+            model = self._models.get(name)
+            if model is not None:
+                self._models.move_to_end(name)
+                self.stats['hits'] += 1
+                return model
+
+            path = os.path.join(self.model_dir, f"{name}.joblib")
+            if not os.path.exists(path):
+                self.stats['missing'] += 1
+                return None
+            # mmap_mode maps large numpy arrays inside the artifact instead of
+            # reading them; compressed artifacts are loaded normally
+            model = joblib.load(path, mmap_mode='r')
+            self.stats['loads'] += 1
+            self._models[name] = model
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+
+class LatencyStats():
+    """
+    Rolling latency percentiles and throughput counters.
+
+    Parameters
+    ----------
+    window : int
+        Number of most recent latencies kept for the percentiles.
+    """
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.counters = {'requests': 0, 'buildings': 0, 'batches': 0,
+                         'model_forecasts': 0, 'persistence_fallbacks': 0, 'no_forecast': 0}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, seconds, **counts):
+        with self._lock:
+            self.latencies.append(seconds)
+            for name, count in counts.items():
+                self.counters[name] += count
+
+    def count(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                self.counters[name] += count
+
+    def report(self):
+        with self._lock:
+            latencies = np.asarray(self.latencies)
+            counters = dict(self.counters)
+        uptime = time.perf_counter() - self.started
+        report = {**counters, 'uptime_s': round(uptime, 3),
+                  'buildings_per_s': round(counters['buildings'] / uptime, 3) if uptime else 0.}
+        if len(latencies):
+            report['p50_ms'] = round(float(np.percentile(latencies, 50)) * 1000, 3)
+            report['p99_ms'] = round(float(np.percentile(latencies, 99)) * 1000, 3)
+        return report
+
+
+class ForecastService():
+    """
+    Micro-batching forecast service.
+
+    Parameters
+    ----------
+    model_dir : str
+        Folder of <name>.joblib model artifacts.
+    history_fn : callable
+        Maps a building id to its recent 1-D load history (None if unknown),
+        e.g. fleet_tensor.FleetTensor.series.
+    metadata : metadata_store.MetadataStore, optional
+        Metadata vectors appended to the default features.
+    feature_fn : callable, optional
+        Maps (building_id, history) to a feature row; replaces the default.
+    max_batch : int
+        Largest micro-batch handed to a model.
+    max_wait_ms : float
+        How long the batcher waits for more requests before running a batch.
+    """
+    def __init__(self, model_dir, history_fn, metadata=None, feature_fn=None,
+                 max_batch=512, max_wait_ms=2., max_models=8):
+        self.models = ModelCache(model_dir, max_models)
+        self.history_fn = history_fn
+        self.metadata = metadata
+        self.feature_fn = feature_fn or self.default_features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def default_features(self, building_id, history):
+        if history is None or len(history) < N_LAGS:
+            return None
+        row = np.asarray(history[len(history) - N_LAGS:], dtype=np.float32)[::-1]
+        if np.isnan(row).any():
+            # one bad row would fail the whole micro-batch
+            return None
+        if self.metadata is not None:
+            md_vector = self.metadata.vector(building_id)
+            if md_vector is None:
+                return None
+            row = np.concatenate([row, md_vector])
+        return row
+
+    # Batching
+    def submit(self, building_id, model_name):
+        """
+        Queues one building and returns a Future of (forecast, source).
+        """
+        future = Future()
+        self._queue.put((building_id, model_name, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._predict_batch(batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _predict_batch(self, batch):
+        self.stats.count(batches=1)
+        by_model = {}
+        for building_id, model_name, future in batch:
+            by_model.setdefault(model_name, []).append((building_id, future))
+
+        for model_name, items in by_model.items():
+            model = self.models.get(model_name) if model_name else None
+            rows, row_items, fallback_items = [], [], []
+            for building_id, future in items:
+                # one bad building must not fail the rest of the micro-batch
+                try:
+                    history = self.history_fn(building_id)
+                except Exception as e:
+                    print(f"Error reading the history of building {building_id}: {e}")
+                    fallback_items.append((future, None))
+                    continue
+                try:
+                    features = self.feature_fn(building_id, history) if model is not None else None
+                except Exception as e:
+                    print(f"Error building the features of building {building_id}, using persistence: {e}")
+                    features = None
+                if features is None:
+                    fallback_items.append((future, history))
+                else:
+                    rows.append(features)
+                    row_items.append((future, history))
+
+            if rows:
+                try:
+                    predictions = np.asarray(model.predict(np.vstack(rows)), dtype=np.float32)
+                    predictions = predictions.reshape(len(rows), -1)
+                except Exception as e:
+                    print(f"Error predicting with model {model_name}, using persistence: {e}")
+                    predictions = None
+                if predictions is None:
+                    fallback_items += row_items
+                else:
+                    # non-finite forecasts would reach clients as bare NaN in the JSON
+                    finite = np.isfinite(predictions).all(axis=1)
+                    for item, forecast, ok in zip(row_items, predictions, finite):
+                        if ok:
+                            item[0].set_result((forecast, 'model'))
+                        else:
+                            fallback_items.append(item)
+                    self.stats.count(model_forecasts=int(finite.sum()))
+
+            for future, history in fallback_items:
+                forecast = persistence_forecast(history)
+                if forecast is None:
+                    self.stats.count(no_forecast=1)
+                    future.set_result((None, 'none'))
+                else:
+                    self.stats.count(persistence_fallbacks=1)
+                    future.set_result((forecast, 'persistence'))
+
+    def forecast(self, building_ids, model_name=None, timeout=30.):
+        """
+        Forecasts the next 96 intervals of many buildings.
+
+        Parameters
+        ----------
+        building_ids : list
+            Buildings to forecast.
+        model_name : str, optional
+            Artifact name; None uses persistence for every building.
+        timeout : float
+            Seconds to wait for the batcher.
+
+        Returns
+        -------
+        dict
+            {building_id: (forecast array or None, source)} where source is
+            'model', 'persistence' or 'none'.
+        """
+        start = time.perf_counter()
+        futures = [(b, self.submit(b, model_name)) for b in building_ids]
+        results = {b: future.result(timeout=timeout) for b, future in futures}
+        self.stats.record(time.perf_counter() - start, requests=1, buildings=len(building_ids))
+        return results
+
+
+def create_app(service):
+    """
+    Returns a Flask app serving a ForecastService.
+
+    Endpoints:
+        POST /forecast  {"building_ids": [...], "model": "name"}
+        GET  /metrics   latency percentiles, throughput and cache counters
+        GET  /health
+    """
+    from flask import Flask, jsonify, request
+
+    app = Flask(__name__)
+
+    @app.route('/forecast', methods=['POST'])
+    def forecast():
+        body = request.get_json(force=True)
+        building_ids = [str(b) for b in body.get('building_ids', [])]
+        results = service.forecast(building_ids, body.get('model'))
+        return jsonify({
+            'forecasts': {b: None if f is None else [float(v) for v in f] for b, (f, _) in results.items()},
+            'source': {b: source for b, (_, source) in results.items()},
+        })
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return jsonify({**service.stats.report(), 'model_cache': service.models.stats})
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({'status': 'ok'})
+
+    return app
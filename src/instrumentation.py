@@ -0,0 +1,365 @@
+"""instrumentation
+
+Per-stage timing and memory instrumentation of the preprocessing pipeline.
+
+Every stage of a building (reading, datetime conversion, weather, merge,
+calendar features, rollups, ...) is wrapped in StageMetrics.stage, which
+records one structured record:
+
+    {'bldg_id', 'stage', 'depth', 'started', 'wall_s', 'rss_delta_mb',
+     'peak_delta_mb', 'rows', 'outcome', 'error', 'pid'}
+
+    - wall_s: wall time of the stage
+    - rss_delta_mb: change of the current RSS over the stage (memory the
+      stage kept)
+    - peak_delta_mb: highest RSS during the stage minus the RSS at its start
+      (memory the stage needed). The kernel's high-water mark (VmHWM) is
+      reset at the start of every stage, so a large earlier building does not
+      hide later ones; where it cannot be reset (not Linux), the growth of the
+      all-time peak (ru_maxrss) is used and reads 0 below an earlier peak
+    - outcome: 'ok', or 'error' when the stage raised or code that swallows
+      its errors reported them with StageMetrics.fail
+
+Records are kept in memory and, with log_path, appended as JSON lines, so
+worker processes of a pool all write to the same structured log. summarize
+turns records into the slowest stages, the slowest buildings and the errors.
+
+profile_call runs one building under cProfile and tracemalloc for a closer
+look.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+OK = 'ok'
+ERROR = 'error'
+
+
+def peak_rss_mb():
+    """
+    Returns the all-time peak resident set size of the process in MB (None if unknown).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 2 ** 10
+
+
+def _proc_status_mb(field):
+    try:
+        with open(PROC_STATUS, 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 2 ** 10
+    except OSError:
+        pass
+    return None
+
+
+def current_rss_mb():
+    """
+    Returns the current resident set size of the process in MB (None if unknown).
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    return _proc_status_mb('VmRSS')
+
+
+def reset_peak_rss():
+    """
+    Resets the kernel's RSS high-water mark (Linux); returns False if it cannot.
+    """
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def high_water_rss_mb():
+    """
+    Returns the RSS high-water mark since the last reset_peak_rss, in MB.
+    """
+    return _proc_status_mb('VmHWM')
+
+
+class StageRecord():
+    """
+    Open record of one stage; set rows, or call fail() for a handled error.
+    """
+    def __init__(self, building_id, stage, depth):
+        self.building_id = building_id
+        self.stage = stage
+        self.depth = depth
+        self.rows = None
+        self.outcome = OK
+        self.error = None
+        # highest RSS seen so far, carried up from nested stages whose start
+        # reset the high-water mark
+        self.peak_mb = None
+
+    def observe_peak(self, peak_mb):
+        if peak_mb is not None and (self.peak_mb is None or peak_mb > self.peak_mb):
+            self.peak_mb = peak_mb
+
+    def fail(self, error):
+        self.outcome = ERROR
+        self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+
+
+class StageMetrics():
+    """
+    Collects stage records in memory and optionally in a JSON lines log.
+
+    Parameters
+    ----------
+    log_path : str, optional
+        JSON lines file the records are appended to.
+    enabled : bool
+        If False, stages run untimed and nothing is recorded.
+    """
+    def __init__(self, log_path=None, enabled=True):
+        self.log_path = log_path
+        self.enabled = enabled
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # pickle without the lock and records so pool workers get a fresh sink
+    def __getstate__(self):
+        return {'log_path': self.log_path, 'enabled': self.enabled}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def stage(self, name, building_id=None):
+        """
+        Times one stage; nested stages inherit the building id of their parent.
+
+        Exceptions are recorded as outcome 'error' and re-raised.
+        """
+        stack = self._stack()
+        if building_id is None and stack:
+            building_id = stack[-1].building_id
+        record = StageRecord(building_id, name, len(stack))
+        if not self.enabled:
+            yield record
+            return
+
+        if stack:
+            # the parent keeps the peak it reached before this stage resets it
+            stack[-1].observe_peak(high_water_rss_mb())
+        stack.append(record)
+        started = time.time()
+        rss_before = current_rss_mb()
+        resettable = reset_peak_rss()
+        max_rss_before = None if resettable else peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.fail(e)
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            rss_after = current_rss_mb()
+            if resettable:
+                record.observe_peak(high_water_rss_mb())
+                peak_delta = None if record.peak_mb is None or rss_before is None \
+                    else record.peak_mb - rss_before
+            else:
+                max_rss_after = peak_rss_mb()
+                peak_delta = None if max_rss_before is None else max_rss_after - max_rss_before
+            stack.pop()
+            if stack:
+                stack[-1].observe_peak(record.peak_mb)
+            self._emit({
+                'bldg_id': None if building_id is None else str(building_id),
+                'stage': name,
+                'depth': record.depth,
+                'started': round(started, 3),
+                'wall_s': round(wall, 6),
+                'rss_delta_mb': None if rss_before is None or rss_after is None
+                else round(rss_after - rss_before, 3),
+                'peak_delta_mb': None if peak_delta is None else round(max(peak_delta, 0.), 3),
+                'rows': record.rows,
+                'outcome': record.outcome,
+                'error': record.error,
+                'pid': os.getpid(),
+            })
+
+    def fail(self, error):
+        """
+        Marks the innermost open stage of this thread as failed.
+
+        For code that handles its own errors (prints and carries on) but should
+        still show up as a failure in the records.
+        """
+        stack = self._stack()
+        if self.enabled and stack:
+            stack[-1].fail(error)
+
+    def _emit(self, entry):
+        with self._lock:
+            self.records.append(entry)
+            if self.log_path is not None:
+                with open(self.log_path, 'a') as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def to_frame(self):
+        with self._lock:
+            return pd.DataFrame(self.records)
+
+    def summary(self, top=10):
+        return summarize(self.to_frame(), top)
+
+    def report(self, top=10):
+        print_report(self.summary(top))
+
+
+def load_records(log_path):
+    """
+    Reads a JSON lines log written by StageMetrics into a DataFrame.
+    """
+    with open(log_path, 'r') as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summarize(records, top=10):
+    """
+    Summarizes stage records.
+
+    Parameters
+    ----------
+    records : pd.DataFrame
+        Records from StageMetrics.to_frame or load_records.
+    top : int
+        Number of buildings and errors listed.
+
+    Returns
+    -------
+    dict
+        'stages': per-stage totals, slowest first;
+        'buildings': wall time and peak memory of each building's top-level stages, slowest first;
+        'errors': the failed records.
+    """
+    if records.empty:
+        return {'stages': pd.DataFrame(), 'buildings': pd.DataFrame(), 'errors': pd.DataFrame()}
+
+    stages = records.groupby('stage').agg(
+        calls=('wall_s', 'size'),
+        total_s=('wall_s', 'sum'),
+        mean_ms=('wall_s', lambda s: s.mean() * 1000),
+        p95_ms=('wall_s', lambda s: np.percentile(s, 95) * 1000),
+        max_ms=('wall_s', lambda s: s.max() * 1000),
+        max_rss_delta_mb=('rss_delta_mb', 'max'),
+        max_peak_delta_mb=('peak_delta_mb', 'max'),
+        rows=('rows', 'sum'),
+        errors=('outcome', lambda s: int((s == ERROR).sum())),
+    ).sort_values('total_s', ascending=False)
+
+    top_level = records[(records['depth'] == 0) & records['bldg_id'].notna()]
+    buildings = top_level.groupby('bldg_id').agg(
+        wall_s=('wall_s', 'sum'),
+        peak_delta_mb=('peak_delta_mb', 'max'),
+        errors=('outcome', lambda s: int((s == ERROR).sum())),
+    ).sort_values('wall_s', ascending=False).head(top)
+
+    # report each failure once, at the innermost stage that recorded it
+    errors = records[records['outcome'] == ERROR]
+    errors = errors.sort_values('depth', ascending=False).drop_duplicates(['bldg_id', 'error'])
+    errors = errors[['bldg_id', 'stage', 'error', 'wall_s']].head(top)
+    return {'stages': stages.round(3), 'buildings': buildings.round(3), 'errors': errors}
+
+
+def print_report(summary):
+    print("Slowest stages:")
+    print(summary['stages'].to_string() if len(summary['stages']) else "  (no records)")
+    print("\nSlowest buildings:")
+    print(summary['buildings'].to_string() if len(summary['buildings']) else "  (no records)")
+    if len(summary['errors']):
+        print("\nErrors:")
+        print(summary['errors'].to_string(index=False))
+
+
+def profile_call(fn, *args, sort='cumulative', top=25, prof_path=None, **kwargs):
+    """
+    Runs fn(*args, **kwargs) under cProfile and tracemalloc.
+
+    Meant for one building at a time, e.g.
+    profile_call(utils.match_l_and_w_from_building_id, building_id).
+
+    Parameters
+    ----------
+    sort : str
+        pstats sort key.
+    top : int
+        Number of functions and allocation sites reported.
+    prof_path : str, optional
+        Also dump the raw profile there (for snakeviz and friends).
+
+    Returns
+    -------
+    dict
+        'result' of the call, 'wall_s', 'profile' (pstats text), 'allocations'
+        (top allocation sites by size) and 'peak_traced_mb'.
+    """
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        wall = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if not already_tracing:
+            tracemalloc.stop()
+
+    if prof_path is not None:
+        profiler.dump_stats(prof_path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(top)
+    return {
+        'result': result,
+        'wall_s': round(wall, 6),
+        'profile': stream.getvalue(),
+        'allocations': [str(stat) for stat in snapshot.statistics('lineno')[:top]],
+        'peak_traced_mb': round(peak / 2 ** 20, 3),
+    }
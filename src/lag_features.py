@@ -0,0 +1,190 @@
+"""lag_features
+
+Zero-copy lag and multi-horizon target matrices for 96-step history.
+
+Replaces the notebooks' `for i in range(1, 97): df[f"shift_{i}"] = ...shift(i)`
+loops. The matrices are strided views over the load series
+(numpy.lib.stride_tricks.sliding_window_view), so a (samples x 96) lag matrix
+costs no more memory than the series itself. Rows line up as follows:
+
+    lags[r]    = [y[t - 1], y[t - 2], ..., y[t - 96]]   (shift_1 ... shift_96)
+    targets[r] = [y[t], y[t + 1], ..., y[t + 95]]       (next 24 hours)
+
+with t = r + n_lags, so every row has a full history and a full horizon.
+
+The views are read-only; copy a chunk (np.ascontiguousarray) before
+modifying it.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+N_LAGS = 96
+HORIZON = 96
+
+
+def _as_series(y, dtype):
+    y = np.asarray(y)
+    if dtype is not None and y.dtype != dtype:
+        # the only copy: the 1-D series itself, never the 96x matrix
+        y = y.astype(dtype)
+    if y.ndim != 1:
+        raise ValueError("Expected a 1-D load series.")
+    return y
+
+
+def n_samples(n, n_lags=N_LAGS, horizon=HORIZON):
+    """
+    Returns the number of rows with a full history and a full horizon.
+    """
+    return max(n - n_lags - horizon + 1, 0)
+
+
+def lag_matrix(y, n_lags=N_LAGS, horizon=HORIZON, dtype=np.float32):
+    """
+    Returns the (samples x n_lags) lag matrix of a series as a strided view.
+
+    Parameters
+    ----------
+    y : array-like
+        1-D load series on a regular 15-minute grid.
+    n_lags : int
+        Number of lags; column j holds shift_{j + 1}.
+    horizon : int
+        Horizon of the matching target matrix, which sets the number of rows.
+    dtype : np.dtype or None
+        Output dtype. None keeps the dtype of y.
+
+    Returns
+    -------
+    np.ndarray
+        Read-only view of shape (n_samples, n_lags).
+    """
+    y = _as_series(y, dtype)
+    rows = n_samples(len(y), n_lags, horizon)
+    windows = sliding_window_view(y, n_lags)[:rows]
+    # reversed columns so column 0 is the most recent value
+    return windows[:, ::-1]
+
+
+def target_matrix(y, n_lags=N_LAGS, horizon=HORIZON, dtype=np.float32):
+    """
+    Returns the (samples x horizon) multi-horizon target matrix as a strided view.
+
+    Parameters
+    ----------
+    y : array-like
+        1-D load series on a regular 15-minute grid.
+    n_lags : int
+        Number of lags of the matching lag matrix.
+    horizon : int
+        Number of future steps; column h holds y[t + h].
+    dtype : np.dtype or None
+        Output dtype. None keeps the dtype of y.
+
+    Returns
+    -------
+    np.ndarray
+        Read-only view of shape (n_samples, horizon).
+    """
+    y = _as_series(y, dtype)
+    rows = n_samples(len(y), n_lags, horizon)
+    return sliding_window_view(y, horizon)[n_lags:n_lags + rows]
+
+
+def lag_and_target(y, n_lags=N_LAGS, horizon=HORIZON, dtype=np.float32):
+    """
+    Returns (lags, targets) sharing the same converted series.
+    """
+    y = _as_series(y, dtype)
+    return lag_matrix(y, n_lags, horizon, None), target_matrix(y, n_lags, horizon, None)
+
+
+def iter_lag_chunks(y, chunk_size=4096, n_lags=N_LAGS, horizon=HORIZON, dtype=np.float32):
+    """
+    Yields (lags, targets) views of consecutive row blocks of one series.
+
+    Parameters
+    ----------
+    y : array-like
+        1-D load series.
+    chunk_size : int
+        Rows per chunk.
+
+    Yields
+    ------
+    tuple
+        (row offset, lags view, targets view).
+    """
+    lags, targets = lag_and_target(y, n_lags, horizon, dtype)
+    for start in range(0, len(lags), chunk_size):
+        yield start, lags[start:start + chunk_size], targets[start:start + chunk_size]
+
+
+def iter_fleet_chunks(series, chunk_size=65536, n_lags=N_LAGS, horizon=HORIZON, dtype=np.float32):
+    """
+    Yields fixed-size (lags, targets) blocks across many buildings.
+
+    Only one block is materialized at a time, so the full fleet's lag design
+    matrix never has to exist in memory.
+
+    Parameters
+    ----------
+    series : iterable of array-like
+        One 1-D load series per building, e.g. a generator reading them lazily.
+    chunk_size : int
+        Rows per yielded block (the last block may be smaller).
+
+    Yields
+    ------
+    tuple
+        (lags, targets) float arrays of shape (rows, n_lags) and (rows, horizon).
+    """
+    lag_parts, target_parts, buffered = [], [], 0
+    for y in series:
+        lags, targets = lag_and_target(y, n_lags, horizon, dtype)
+        start = 0
+        while start < len(lags):
+            take = min(chunk_size - buffered, len(lags) - start)
+            lag_parts.append(lags[start:start + take])
+            target_parts.append(targets[start:start + take])
+            buffered += take
+            start += take
+            if buffered == chunk_size:
+                yield np.concatenate(lag_parts), np.concatenate(target_parts)
+                lag_parts, target_parts, buffered = [], [], 0
+    if buffered:
+        yield np.concatenate(lag_parts), np.concatenate(target_parts)
+
+
+def lag_columns(n_lags=N_LAGS):
+    """
+    Returns the notebook column names shift_1 ... shift_{n_lags}.
+    """
+    return [f"shift_{i}" for i in range(1, n_lags + 1)]
+
+
+def lag_dataframe(df, column='out.electricity.total.energy_consumption', n_lags=N_LAGS, dtype=np.float32):
+    """
+    Adds shift_1 ... shift_{n_lags} columns to a building frame in one block.
+
+    Same values as the notebooks' shift loop, built from the strided view with a
+    single allocation instead of 96 column inserts. Rows without a full history
+    are dropped, as the notebooks' dropna() does.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Building frame on a regular 15-minute grid.
+    column : str
+        Load column to lag.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    y = _as_series(df[column].to_numpy(), dtype)
+    lags = sliding_window_view(y, n_lags)[:len(y) - n_lags, ::-1]
+    lag_df = pd.DataFrame(lags, columns=lag_columns(n_lags), index=df.index[n_lags:])
+    return pd.concat([df.iloc[n_lags:], lag_df], axis=1)
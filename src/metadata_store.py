@@ -0,0 +1,234 @@
+"""metadata_store
+
+Indexed, dictionary-encoded metadata store.
+
+The encoded metadata CSVs in src/preprocessing/ (or the raw metadata.csv) are
+loaded once into a compact columnar form:
+    - numeric columns as one float32 matrix
+    - categorical columns as integer codes plus a category list
+    - an id -> row index, so joining a building to its metadata is an O(1)
+      lookup and joining many buildings is a single array gather
+    - bitmap indexes (np.packbits) for every category of every categorical
+      column and every 0/1 one-hot column, so cohort filters such as
+      "Education in Mixed-Humid" and their intersection with the ids of a
+      split JSON are a few bitwise ANDs
+
+Missing categorical values (NaN in the raw metadata.csv) get code -1, decode
+to None, and have their own bitmap: where(column, None).
+
+One-hot encoded columns can be queried by their original name:
+where('in.building_america_climate_zone', 'Mixed-Humid') resolves to the
+'in.building_america_climate_zone_Mixed-Humid' column when the categorical
+column itself is not present.
+"""
+
+import numpy as np
+import pandas as pd
+
+from streaming_loader import load_building_ids
+
+
+class MetadataStore():
+    """
+    Compact columnar metadata with O(1) id lookups and bitmap cohort queries.
+
+    Parameters
+    ----------
+    md : pd.DataFrame
+        Metadata with a 'bldg_id' column.
+    """
+    def __init__(self, md):
+        md = md.reset_index(drop=True)
+        self.ids = md['bldg_id'].astype(np.int64).to_numpy()
+        self.n = len(self.ids)
+        self.row_of = {int(b): i for i, b in enumerate(self.ids)}
+        # dense id -> row array for vectorized gathers (-1 = unknown id)
+        self._dense_rows = np.full(self.ids.max() + 1, -1, dtype=np.int64)
+        self._dense_rows[self.ids] = np.arange(self.n)
+
+        columns = md.drop(columns=['bldg_id'])
+        self.numeric_columns = [c for c in columns if pd.api.types.is_numeric_dtype(columns[c])]
+        self.categorical_columns = [c for c in columns if c not in self.numeric_columns]
+
+        self.numeric = columns[self.numeric_columns].to_numpy(dtype=np.float32)
+        self.codes = {}
+        self.categories = {}
+        for column in self.categorical_columns:
+            # missing values get code -1
+            codes, categories = pd.factorize(columns[column], sort=True)
+            self.codes[column] = codes.astype(np.int16 if len(categories) < 2 ** 15 else np.int32)
+            self.categories[column] = list(categories)
+
+        self.bitmaps = {}
+        for column in self.categorical_columns:
+            for code, category in enumerate(self.categories[column]):
+                self.bitmaps[(column, category)] = np.packbits(self.codes[column] == code)
+            self.bitmaps[(column, None)] = np.packbits(self.codes[column] < 0)
+        for j, column in enumerate(self.numeric_columns):
+            values = self.numeric[:, j]
+            if np.isin(values, (0., 1.)).all():
+                self.bitmaps[(column, 1)] = np.packbits(values == 1.)
+                self.bitmaps[(column, 0)] = np.packbits(values == 0.)
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Loads a metadata CSV such as src/preprocessing/md_one_hot_encoded.csv.
+        """
+        md = pd.read_csv(path)
+        return cls(md.drop(columns=[c for c in md.columns if c.startswith('Unnamed')]))
+
+    # Lookups
+    @property
+    def columns(self):
+        return self.numeric_columns + self.categorical_columns
+
+    def row(self, building_id):
+        return self.row_of.get(int(str(building_id).split('.')[0]))
+
+    def rows(self, building_ids):
+        """
+        Returns the rows of many buildings as an int64 array (-1 for unknown ids).
+        """
+        ids = np.asarray([int(str(b).split('.')[0]) for b in building_ids], dtype=np.int64)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self._dense_rows))
+        rows[known] = self._dense_rows[ids[known]]
+        return rows
+
+    def _feature_matrix(self, rows):
+        parts = [self.numeric[rows]]
+        parts += [self.codes[c][rows, None].astype(np.float32) for c in self.categorical_columns]
+        return np.concatenate(parts, axis=1)
+
+    def vector(self, building_id):
+        """
+        Returns the float32 feature vector of one building (numeric columns,
+        then categorical codes, -1 if missing), or None for an unknown id.
+        """
+        row = self.row(building_id)
+        if row is None:
+            return None
+        return self._feature_matrix(np.array([row]))[0]
+
+    def vectors(self, building_ids):
+        """
+        Gathers the feature vectors of many buildings; unknown ids get NaN rows.
+
+        Returns
+        -------
+        np.ndarray
+            float32 array of shape (len(building_ids), len(columns)).
+        """
+        rows = self.rows(building_ids)
+        matrix = self._feature_matrix(np.maximum(rows, 0))
+        matrix[rows < 0] = np.nan
+        return matrix
+
+    def _decode(self, column, codes):
+        # code -1 (missing) decodes to None
+        categories = np.asarray(self.categories[column] + [None], dtype=object)
+        return categories[np.where(codes < 0, len(categories) - 1, codes)]
+
+    def value(self, building_id, column):
+        """
+        Returns the decoded value of one column for one building (None if missing).
+        """
+        row = self.row(building_id)
+        if row is None:
+            return None
+        if column in self.codes:
+            return self._decode(column, self.codes[column][row])
+        return self.numeric[row, self.numeric_columns.index(column)]
+
+    def labels(self, column):
+        """
+        Returns {bldg_id: decoded value} for a categorical column; missing
+        values are None.
+        """
+        return dict(zip(self.ids.tolist(), self._decode(column, self.codes[column])))
+
+    # Bitmap queries
+    def empty(self):
+        return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+
+    def full(self):
+        return np.packbits(np.ones(self.n, dtype=bool))
+
+    def where(self, column, value=1):
+        """
+        Returns the bitmap of buildings whose column equals value.
+
+        Parameters
+        ----------
+        column : str
+            Categorical column, 0/1 column, or the original name of a one-hot
+            encoded column.
+        value : object or list
+            Value to match; a list matches any of its values. None (or NaN)
+            matches the missing values of a categorical column.
+
+        Returns
+        -------
+        np.ndarray
+            Packed uint8 bitmap over the store's rows.
+        """
+        if isinstance(value, (list, tuple, set)):
+            bitmap = self.empty()
+            for v in value:
+                bitmap |= self.where(column, v)
+            return bitmap
+        if isinstance(value, float) and np.isnan(value):
+            value = None
+        bitmap = self.bitmaps.get((column, value))
+        if bitmap is None:
+            bitmap = self.bitmaps.get((f"{column}_{value}", 1))
+        if bitmap is None:
+            raise KeyError(f"No bitmap index for {column} = {value}")
+        return bitmap
+
+    def cohort(self, conditions):
+        """
+        ANDs the bitmaps of several column conditions.
+
+        Parameters
+        ----------
+        conditions : dict
+            {column: value or list of values}, e.g.
+            {'in.comstock_building_type_group': 'Education',
+             'in.building_america_climate_zone': 'Mixed-Humid'}.
+
+        Returns
+        -------
+        np.ndarray
+            Packed uint8 bitmap.
+        """
+        bitmap = self.full()
+        for column, value in conditions.items():
+            bitmap = bitmap & self.where(column, value)
+        return bitmap
+
+    def bitmap_for_ids(self, building_ids):
+        """
+        Returns the bitmap of the given building ids (unknown ids are ignored).
+        """
+        rows = self.rows(building_ids)
+        mask = np.zeros(self.n, dtype=bool)
+        mask[rows[rows >= 0]] = True
+        return np.packbits(mask)
+
+    def split_bitmaps(self, json_file_path):
+        """
+        Returns the (train, test) bitmaps of a split JSON file.
+        """
+        train_ids, test_ids = load_building_ids(json_file_path)
+        return self.bitmap_for_ids(train_ids), self.bitmap_for_ids(test_ids)
+
+    def to_ids(self, bitmap):
+        """
+        Returns the building ids set in a bitmap.
+        """
+        return self.ids[np.flatnonzero(np.unpackbits(bitmap, count=self.n))]
+
+    def count(self, bitmap):
+        return int(np.unpackbits(bitmap, count=self.n).sum())
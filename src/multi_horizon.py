@@ -0,0 +1,367 @@
+"""multi_horizon
+
+Direct multi-horizon global forecaster.
+
+The tree notebooks predict one row at a time, so a day-ahead forecast costs
+96 model calls or a recursive loop. Here one model, trained across buildings,
+maps a building-day feature row straight to the 96 loads of the next day, and
+a batch of buildings is forecast with a single predict() call.
+
+A building-day row holds (see day_samples):
+    - the loads of the last n_lag_days days, oldest first
+    - the hourly dry bulb temperature, relative humidity and heat index of the
+      target day (the actual weather stands in for a day-ahead weather
+      forecast, as in the model notebooks)
+    - the calendar of the target day: day of week (one-hot), workday and
+      US-holiday flags, cyclic month
+    - the building's metadata vector
+
+Buildings differ in size by orders of magnitude, so the lags and the targets
+are divided by the mean load of the last day before fitting, and forecasts are
+scaled back. The default estimator is a multi-output ridge regression; any
+scikit-learn regressor with 2-D targets works, and n_components compresses the
+96 targets onto their principal components (day profiles are low-rank).
+
+Fitted models are plain joblib artifacts with predict(X) -> (buildings x 96),
+so forecast_server.ModelCache can serve them. Their rows are not the server's
+default 96-lag rows: pass a DayAheadFeatures as the ForecastService
+feature_fn to build day_samples rows from OnlineFeatureEngine or FleetTensor
+history.
+"""
+
+import time
+
+import numpy as np
+
+from calendar_features import build_features
+from persistence import smape
+
+STEPS_PER_DAY = 96
+STEPS_PER_HOUR = 4
+LOAD_CHANNEL = 'out.electricity.total.energy_consumption'
+WEATHER_CHANNELS = ['Dry Bulb Temperature [°C]', 'Relative Humidity [%]', 'heat_index']
+
+
+def calendar_block(dates):
+    """
+    Returns the calendar features of the target days, shape (days, 11).
+    """
+    calendar = build_features(np.asarray(dates, dtype='datetime64[ns]'))
+    day_of_week = np.eye(7, dtype=np.float32)[calendar['day_of_week'].to_numpy()]
+    month = calendar['month'].to_numpy(dtype=np.float32)
+    return np.column_stack([
+        day_of_week,
+        calendar['is_weekday'].to_numpy(dtype=np.float32),
+        calendar['is_holiday'].to_numpy(dtype=np.float32),
+        np.sin(2 * np.pi * month / 12).astype(np.float32),
+        np.cos(2 * np.pi * month / 12).astype(np.float32),
+    ])
+
+
+def day_samples(daily, weather_daily, dates, md_vectors, n_lag_days=7, days=None):
+    """
+    Builds building-day feature rows and their 96-step targets.
+
+    Parameters
+    ----------
+    daily : np.ndarray
+        Loads of shape (buildings, days, 96), see persistence.stack_daily.
+    weather_daily : np.ndarray
+        Weather of shape (buildings, days, 96, channels), or None.
+    dates : array-like of datetime64[D]
+        Date of each day, see persistence.day_dates.
+    md_vectors : np.ndarray
+        Metadata vectors of shape (buildings, columns), or None.
+    n_lag_days : int
+        Days of load history per row.
+    days : array-like of int, optional
+        Target days to build; defaults to every day with full history.
+
+    Returns
+    -------
+    tuple
+        (X, Y, index): X float32 (rows, features), Y float32 (rows, 96) and an
+        int64 (rows, 2) array of (building row, target day).
+    """
+    n_buildings, n_days, _ = daily.shape
+    days = np.arange(n_lag_days, n_days) if days is None else np.asarray(days, dtype=np.int64)
+    rows = np.repeat(np.arange(n_buildings), len(days))
+    target_days = np.tile(days, n_buildings)
+
+    # (buildings, windows, n_lag_days, 96) view over consecutive days
+    windows = np.lib.stride_tricks.sliding_window_view(daily, n_lag_days, axis=1).transpose(0, 1, 3, 2)
+    parts = [windows[rows, target_days - n_lag_days].reshape(len(rows), -1)]
+    if weather_daily is not None:
+        hourly = weather_daily[:, :, ::STEPS_PER_HOUR]
+        parts.append(hourly[rows, target_days].reshape(len(rows), -1))
+    parts.append(calendar_block(np.asarray(dates)[target_days]))
+    if md_vectors is not None:
+        parts.append(np.asarray(md_vectors, dtype=np.float32)[rows])
+
+    X = np.concatenate([np.asarray(p, dtype=np.float32) for p in parts], axis=1)
+    Y = daily[rows, target_days].astype(np.float32)
+    return X, Y, np.column_stack([rows, target_days])
+
+
+def fleet_day_samples(tensor, building_ids, metadata=None, n_lag_days=7, days=None):
+    """
+    Builds day_samples from a fleet_tensor.FleetTensor and a MetadataStore.
+
+    The tensor should start at a day boundary (interval 0 at 00:15).
+    """
+    building_ids = [str(b) for b in building_ids]
+    data = tensor.gather(building_ids)
+    n_days = data.shape[1] // STEPS_PER_DAY
+    data = data[:, :n_days * STEPS_PER_DAY].reshape(len(building_ids), n_days, STEPS_PER_DAY, -1)
+    daily = data[..., tensor.channel(LOAD_CHANNEL)]
+    weather = [c for c in WEATHER_CHANNELS if c in tensor.channels]
+    weather_daily = data[..., [tensor.channel(c) for c in weather]] if weather else None
+    start = '2018-01-01' if tensor.start is None else tensor.start.normalize().date()
+    dates = np.datetime64(start, 'D') + np.arange(n_days)
+    md_vectors = None if metadata is None else metadata.vectors(building_ids)
+    return day_samples(daily, weather_daily, dates, md_vectors, n_lag_days, days)
+
+
+def engine_target_date(engine):
+    """
+    Returns a date_fn giving the day after the last reading of an
+    online_features.OnlineFeatureEngine.
+
+    Days run from 00:15 to 24:00, as in fleet_day_samples, so a reading at
+    00:00 closes the previous day.
+    """
+    from online_features import DAY_NS, NO_TIME
+
+    def target_date(building_id, history):
+        last_time = engine.last_time[engine.slot_of[str(building_id)]]
+        if last_time == NO_TIME:
+            return None
+        return np.datetime64(int(last_time // DAY_NS), 'D')
+
+    return target_date
+
+
+def tensor_target_date(tensor):
+    """
+    Returns a date_fn for histories that are a prefix of a fleet_tensor.FleetTensor
+    series: the target day is the day of the next interval.
+    """
+    start = np.datetime64('2018-01-01' if tensor.start is None else tensor.start.normalize().date(), 'D')
+
+    def target_date(building_id, history):
+        return start + len(history) // STEPS_PER_DAY
+
+    return target_date
+
+
+def tensor_weather(tensor):
+    """
+    Returns a weather_fn reading a day's weather from a fleet_tensor.FleetTensor
+    (None outside the tensor), for replaying a year as if it were live.
+    """
+    channels = [tensor.channel(c) for c in WEATHER_CHANNELS if c in tensor.channels]
+    start = np.datetime64('2018-01-01' if tensor.start is None else tensor.start.normalize().date(), 'D')
+
+    def weather(building_id, date):
+        day = int((np.datetime64(date, 'D') - start).astype(np.int64))
+        if not channels or day < 0 or (day + 1) * STEPS_PER_DAY > tensor.n_intervals:
+            return None
+        return tensor.building(building_id)[day * STEPS_PER_DAY:(day + 1) * STEPS_PER_DAY, channels]
+
+    return weather
+
+
+class DayAheadFeatures():
+    """
+    ForecastService feature_fn building day_samples rows from live history.
+
+    A row is the last n_lag_days days of history, the target day's hourly
+    weather, its calendar and the metadata vector, in the layout of
+    day_samples. The model is trained on day-aligned origins, so histories
+    should end with the reading at 00:00.
+
+    Parameters
+    ----------
+    date_fn : callable
+        Maps (building_id, history) to the target date (datetime64[D]) or
+        None, see engine_target_date and tensor_target_date.
+    weather_fn : callable, optional
+        Maps (building_id, date) to the day's weather, shape (96 or 24,
+        channels) in WEATHER_CHANNELS order, or None if unknown (e.g. a
+        day-ahead weather forecast, or tensor_weather). Leave it out for
+        models trained without weather.
+    metadata : metadata_store.MetadataStore, optional
+        Metadata vectors, for models trained with them.
+    n_lag_days : int
+        Days of load history per row (must match the model).
+    """
+    def __init__(self, date_fn, weather_fn=None, metadata=None, n_lag_days=7):
+        self.date_fn = date_fn
+        self.weather_fn = weather_fn
+        self.metadata = metadata
+        self.n_lag_days = n_lag_days
+
+    def __call__(self, building_id, history):
+        n_lags = self.n_lag_days * STEPS_PER_DAY
+        if history is None or len(history) < n_lags:
+            return None
+        date = self.date_fn(building_id, history)
+        if date is None:
+            return None
+        parts = [np.asarray(history[len(history) - n_lags:], dtype=np.float32)]
+        if self.weather_fn is not None:
+            weather = self.weather_fn(building_id, date)
+            if weather is None:
+                return None
+            weather = np.asarray(weather, dtype=np.float32)
+            if len(weather) == STEPS_PER_DAY:
+                weather = weather[::STEPS_PER_HOUR]
+            parts.append(weather.reshape(-1))
+        parts.append(calendar_block([date])[0])
+        if self.metadata is not None:
+            md_vector = self.metadata.vector(building_id)
+            if md_vector is None:
+                return None
+            parts.append(np.asarray(md_vector, dtype=np.float32))
+        row = np.concatenate(parts)
+        if np.isnan(row).any():
+            # one bad row would fail the whole micro-batch
+            return None
+        if not parts[0][-STEPS_PER_DAY:].mean() > 0:
+            # the model scales by the last day's mean load; let the server
+            # use persistence for vacant, zeroed-out or net-negative meters
+            return None
+        return row
+
+
+class DirectMultiHorizonModel():
+    """
+    Global model predicting the next 96 intervals of many buildings at once.
+
+    Parameters
+    ----------
+    estimator : sklearn regressor, optional
+        Multi-output regressor; defaults to Ridge(alpha=1.0).
+    n_lag_days : int
+        Days of load history in the rows (must match day_samples).
+    n_components : int, optional
+        Fit the estimator on this many principal components of the scaled
+        targets instead of all 96.
+    """
+    def __init__(self, estimator=None, n_lag_days=7, n_components=None):
+        if estimator is None:
+            from sklearn.linear_model import Ridge
+            estimator = Ridge(alpha=1.0)
+        self.estimator = estimator
+        self.n_lag_days = n_lag_days
+        self.n_components = n_components
+        self.pca = None
+        self.mean_ = None
+        self.std_ = None
+
+    def _scaled(self, X):
+        # divide the lag block by the mean load of the last day
+        n_lags = self.n_lag_days * STEPS_PER_DAY
+        X = np.array(X, dtype=np.float32)
+        with np.errstate(invalid='ignore'):
+            scale = np.nanmean(X[:, n_lags - STEPS_PER_DAY:n_lags], axis=1)
+        scale = np.where(np.isfinite(scale) & (scale > 0), scale, np.nan).astype(np.float32)
+        X[:, :n_lags] /= scale[:, None]
+        if self.mean_ is not None:
+            # standardize so wide-ranged metadata (in.sqft) does not dominate
+            X = (X - self.mean_) / self.std_
+        return X, scale
+
+    def fit(self, X, Y):
+        """
+        Fits on day_samples rows; rows with missing values are dropped.
+        """
+        self.mean_ = self.std_ = None
+        X, scale = self._scaled(X)
+        Y = np.asarray(Y, dtype=np.float32) / scale[:, None]
+        keep = ~(np.isnan(X).any(axis=1) | np.isnan(Y).any(axis=1))
+        X, Y = X[keep], Y[keep]
+        self.mean_ = X.mean(axis=0)
+        std = X.std(axis=0)
+        self.std_ = np.where(std > 0, std, 1.).astype(np.float32)
+        X = (X - self.mean_) / self.std_
+        if self.n_components is not None:
+            from sklearn.decomposition import PCA
+            self.pca = PCA(n_components=self.n_components).fit(Y)
+            Y = self.pca.transform(Y)
+        self.estimator.fit(X, Y)
+        return self
+
+    def predict(self, X):
+        """
+        Forecasts the next 96 intervals of every row in one call.
+
+        Rows whose last day has no positive mean load cannot be scaled; they
+        get the persistence forecast (the last day of their lag block).
+
+        Returns
+        -------
+        np.ndarray
+            float32 array of shape (rows, 96); NaN for rows with missing values.
+        """
+        n_lags = self.n_lag_days * STEPS_PER_DAY
+        last_day = np.array(np.asarray(X, dtype=np.float32)[:, n_lags - STEPS_PER_DAY:n_lags])
+        X, scale = self._scaled(X)
+        forecast = np.full((len(X), STEPS_PER_DAY), np.nan, dtype=np.float32)
+        unscaled = np.isnan(scale)
+        forecast[unscaled] = last_day[unscaled]
+        valid = ~np.isnan(X).any(axis=1) & ~unscaled
+        if valid.any():
+            Y = self.estimator.predict(X[valid])
+            if self.pca is not None:
+                Y = self.pca.inverse_transform(Y)
+            forecast[valid] = np.asarray(Y, dtype=np.float32).reshape(-1, STEPS_PER_DAY) * scale[valid, None]
+        return forecast
+
+
+def benchmark_inference(model, X, Y=None, n_lag_days=7, repeats=20):
+    """
+    Compares the inference cost (and accuracy) of a model with persistence.
+
+    Persistence repeats the last day of the lag block, the same rows the
+    model sees.
+
+    Parameters
+    ----------
+    model : DirectMultiHorizonModel
+        Fitted model.
+    X : np.ndarray
+        day_samples rows of the buildings to forecast.
+    Y : np.ndarray, optional
+        Actual loads, to add SMAPE to the report.
+    repeats : int
+        Timed repetitions; the best one is reported.
+
+    Returns
+    -------
+    dict
+        Microseconds per building-day of both forecasters, the slowdown factor
+        and, with Y, their SMAPE.
+    """
+    n_lags = n_lag_days * STEPS_PER_DAY
+
+    def best_time(fn):
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - start)
+        return best, result
+
+    model_s, model_forecast = best_time(lambda: model.predict(X))
+    persistence_s, persistence_forecast = best_time(lambda: np.array(X[:, n_lags - STEPS_PER_DAY:n_lags]))
+    report = {
+        'buildings': len(X),
+        'model_us_per_building_day': round(model_s / len(X) * 1e6, 3),
+        'persistence_us_per_building_day': round(persistence_s / len(X) * 1e6, 3),
+        'slowdown': round(model_s / persistence_s, 1) if persistence_s > 0 else None,
+    }
+    if Y is not None:
+        report['model_smape'] = round(float(smape(Y, model_forecast)), 3)
+        report['persistence_smape'] = round(float(smape(Y, persistence_forecast)), 3)
+    return report
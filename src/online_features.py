@@ -0,0 +1,285 @@
+"""online_features
+
+Incremental feature engine for live 15-minute meter readings.
+
+Unlike Utils.match_l_and_w_from_building_id, nothing is recomputed from a
+year of history. Each building owns a slot in a set of NumPy arrays:
+    - a ring buffer of its last `capacity` loads (96 for the lags and daily
+      persistence, 672 by default so weekly persistence works too)
+    - running count/sum/sum of squares/max/min of load and temperature for
+      the current clock hour and the current day (the same hour/day groups
+      as rollups.py, but only over the readings seen so far)
+    - the last two hourly weather observations, linearly interpolated at the
+      reading time (the last observation is held once the reading is past it)
+      and the heat index from weather_kernel
+
+update() applies a batch of readings (at most one per building) to all
+buildings at once with array operations, so each reading costs O(1) and
+forecasts can be refreshed every interval for thousands of buildings.
+"""
+
+import numpy as np
+import pandas as pd
+
+from weather_kernel import heat_index
+
+STEPS_PER_DAY = 96
+STEP_NS = 15 * 60 * 10 ** 9
+HOUR_NS = 3600 * 10 ** 9
+DAY_NS = 24 * HOUR_NS
+NO_TIME = np.iinfo(np.int64).min
+
+HOURLY, DAILY = 0, 1
+LOAD, TEMP = 0, 1
+
+_US_HOLIDAYS = {}
+
+
+def _holiday_days(year):
+    # days since epoch of the US holidays of a year, cached per year
+    if year not in _US_HOLIDAYS:
+        import holidays
+        days = _to_ns(sorted(holidays.US(years=year))) // DAY_NS
+        _US_HOLIDAYS[year] = set(days.tolist())
+    return _US_HOLIDAYS[year]
+
+
+def _to_ns(timestamps):
+    stamps = pd.DatetimeIndex(np.atleast_1d(timestamps))
+    return stamps.values.astype('datetime64[ns]').astype(np.int64)
+
+
+class OnlineFeatureEngine():
+    """
+    Per-building streaming state with O(1) updates.
+
+    Parameters
+    ----------
+    building_ids : list
+        Buildings to track; each gets one slot.
+    capacity : int
+        Loads kept per building (at least 96).
+    """
+    def __init__(self, building_ids, capacity=7 * STEPS_PER_DAY):
+        if capacity < STEPS_PER_DAY:
+            raise ValueError("capacity must hold at least one day of readings.")
+        self.building_ids = [str(b) for b in building_ids]
+        self.slot_of = {b: i for i, b in enumerate(self.building_ids)}
+        n = len(self.building_ids)
+        self.capacity = capacity
+
+        self.loads = np.full((n, capacity), np.nan, dtype=np.float32)
+        self.head = np.zeros(n, dtype=np.int64)        # next write position
+        self.n_seen = np.zeros(n, dtype=np.int64)      # intervals pushed, gaps included
+        self.last_time = np.full(n, NO_TIME, dtype=np.int64)
+
+        # rollup accumulators: (buildings, period, channel)
+        self.period_key = np.full((n, 2), NO_TIME, dtype=np.int64)
+        self.count = np.zeros((n, 2, 2), dtype=np.int64)
+        self.sum = np.zeros((n, 2, 2), dtype=np.float64)
+        self.sumsq = np.zeros((n, 2, 2), dtype=np.float64)
+        self.max = np.full((n, 2, 2), -np.inf, dtype=np.float64)
+        self.min = np.full((n, 2, 2), np.inf, dtype=np.float64)
+
+        # hourly weather observations: previous and last
+        self.weather_time = np.full((n, 2), NO_TIME, dtype=np.int64)
+        self.weather = np.full((n, 2, 2), np.nan, dtype=np.float64)  # (buildings, obs, [temp, rh])
+
+        # latest derived values per building
+        self.temperature = np.full(n, np.nan)
+        self.humidity = np.full(n, np.nan)
+        self.heat_index = np.full(n, np.nan)
+
+    def slots(self, building_ids):
+        return np.asarray([self.slot_of[str(b)] for b in building_ids], dtype=np.int64)
+
+    # Weather
+    def update_weather(self, building_ids, timestamps, temperature, humidity):
+        """
+        Records new hourly weather observations (degC and percent).
+        """
+        slots = self.slots(building_ids)
+        times = np.broadcast_to(_to_ns(timestamps), slots.shape)
+        newer = times > self.weather_time[slots, 1]
+        slots, times = slots[newer], times[newer]
+        temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64), newer.shape)[newer]
+        humidity = np.broadcast_to(np.asarray(humidity, dtype=np.float64), newer.shape)[newer]
+        self.weather_time[slots, 0] = self.weather_time[slots, 1]
+        self.weather[slots, 0] = self.weather[slots, 1]
+        self.weather_time[slots, 1] = times
+        self.weather[slots, 1, 0] = temperature
+        self.weather[slots, 1, 1] = humidity
+
+    def _weather_at(self, slots, times):
+        t0, t1 = self.weather_time[slots, 0], self.weather_time[slots, 1]
+        w0, w1 = self.weather[slots, 0], self.weather[slots, 1]
+        span = (t1 - t0).astype(np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fraction = np.clip((times - t0) / span, 0., 1.)
+        interpolate = (t0 != NO_TIME) & (span > 0) & (times < t1)
+        fraction = np.where(interpolate, fraction, 1.)[:, None]
+        values = np.where(interpolate[:, None], w0 + (w1 - w0) * fraction, w1)
+        return values[:, 0], values[:, 1]
+
+    # Loads
+    def _fill_gaps(self, slots, times):
+        # push NaNs for skipped intervals so lag positions stay aligned
+        previous = self.last_time[slots]
+        missing = np.where(previous == NO_TIME, 0, (times - previous) // STEP_NS - 1)
+        for slot, n_missing in zip(slots[missing > 0], missing[missing > 0]):
+            n_missing = min(int(n_missing), self.capacity)
+            positions = (self.head[slot] + np.arange(n_missing)) % self.capacity
+            self.loads[slot, positions] = np.nan
+            self.head[slot] = (self.head[slot] + n_missing) % self.capacity
+            self.n_seen[slot] += n_missing
+
+    def _accumulate(self, slots, times, values):
+        # values: (readings, channel)
+        keys = np.stack([times // HOUR_NS, times // DAY_NS], axis=1)
+        new_period = keys != self.period_key[slots]
+        for period in (HOURLY, DAILY):
+            reset = slots[new_period[:, period]]
+            self.count[reset, period] = 0
+            self.sum[reset, period] = 0.
+            self.sumsq[reset, period] = 0.
+            self.max[reset, period] = -np.inf
+            self.min[reset, period] = np.inf
+        self.period_key[slots] = keys
+
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.)[:, None, :]
+        valid = valid[:, None, :]
+        self.count[slots] += valid
+        self.sum[slots] += filled
+        self.sumsq[slots] += filled * filled
+        self.max[slots] = np.where(valid, np.maximum(self.max[slots], filled), self.max[slots])
+        self.min[slots] = np.where(valid, np.minimum(self.min[slots], filled), self.min[slots])
+
+    def update(self, building_ids, timestamps, loads):
+        """
+        Applies one 15-minute reading per building.
+
+        Parameters
+        ----------
+        building_ids : list
+            Buildings reporting, each at most once per call.
+        timestamps : array-like of datetime64
+            Reading times (one per building, or one shared time).
+        loads : array-like
+            Load readings.
+        """
+        slots = self.slots(building_ids)
+        if len(np.unique(slots)) != len(slots):
+            raise ValueError("update() takes at most one reading per building per call.")
+        times = np.broadcast_to(_to_ns(timestamps), slots.shape).copy()
+        loads = np.asarray(loads, dtype=np.float32).reshape(slots.shape)
+
+        stale = times <= self.last_time[slots]
+        if stale.any():
+            # out-of-order or repeated readings are dropped
+            slots, times, loads = slots[~stale], times[~stale], loads[~stale]
+
+        self._fill_gaps(slots, times)
+        self.loads[slots, self.head[slots]] = loads
+        self.head[slots] = (self.head[slots] + 1) % self.capacity
+        self.n_seen[slots] += 1
+        self.last_time[slots] = times
+
+        temperature, humidity = self._weather_at(slots, times)
+        self.temperature[slots] = temperature
+        self.humidity[slots] = humidity
+        self.heat_index[slots] = heat_index(temperature, humidity)
+        self._accumulate(slots, times, np.column_stack([loads.astype(np.float64), temperature]))
+
+    # Outputs
+    def history(self, slots, n=STEPS_PER_DAY):
+        """
+        Returns the last n loads of each slot in time order, shape (slots, n).
+        """
+        positions = (self.head[slots, None] - n + np.arange(n)) % self.capacity
+        return np.take_along_axis(self.loads[slots], positions, axis=1)
+
+    def series(self, building_id):
+        """
+        Returns the buffered loads of one building in time order, or None for
+        an unknown building. Works as the history_fn of
+        forecast_server.ForecastService.
+        """
+        slot = self.slot_of.get(str(building_id))
+        if slot is None:
+            return None
+        return self.history(np.array([slot]), min(self.capacity, int(self.n_seen[slot])))[0]
+
+    def persistence_forecast(self, building_ids, lag_days=1):
+        """
+        Returns the persistence forecast of the next 96 intervals.
+
+        Parameters
+        ----------
+        building_ids : list
+            Buildings to forecast.
+        lag_days : int
+            1 for the prior 24 hours, 7 for the same weekday last week.
+
+        Returns
+        -------
+        np.ndarray
+            float32 array of shape (buildings, 96).
+        """
+        slots = self.slots(building_ids)
+        lag = lag_days * STEPS_PER_DAY
+        if lag > self.capacity:
+            raise ValueError(f"capacity {self.capacity} is too small for lag_days={lag_days}.")
+        return self.history(slots, lag)[:, :STEPS_PER_DAY]
+
+    def _rollup(self, slots):
+        count = self.count[slots]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.sum[slots] / count
+            variance = (self.sumsq[slots] - count * mean * mean) / (count - 1)
+        has = count > 0
+        return {
+            'max': np.where(has, self.max[slots], np.nan),
+            'min': np.where(has, self.min[slots], np.nan),
+            'mean': np.where(has, mean, np.nan),
+            'std': np.where(count > 1, np.sqrt(np.maximum(variance, 0.)), np.nan),
+        }
+
+    def features(self, building_ids, n_lags=STEPS_PER_DAY):
+        """
+        Returns the current model features of each building.
+
+        Columns: shift_1 ... shift_{n_lags} (most recent first), the running
+        '{stat}_{load|temp}_{hourly|daily}' rollups, the interpolated weather
+        and heat index, and the calendar features of the last reading.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per building, indexed by building id.
+        """
+        slots = self.slots(building_ids)
+        lags = self.history(slots, n_lags)[:, ::-1]
+        columns = {f"shift_{i + 1}": lags[:, i] for i in range(n_lags)}
+
+        rollup = self._rollup(slots)
+        for stat, values in rollup.items():
+            for period, period_name in ((HOURLY, 'hourly'), (DAILY, 'daily')):
+                columns[f'{stat}_load_{period_name}'] = values[:, period, LOAD].astype(np.float32)
+                columns[f'{stat}_temp_{period_name}'] = values[:, period, TEMP].astype(np.float32)
+
+        columns['Dry Bulb Temperature [°C]'] = self.temperature[slots]
+        columns['Relative Humidity [%]'] = self.humidity[slots]
+        columns['heat_index'] = self.heat_index[slots]
+
+        times = self.last_time[slots]
+        seen = times != NO_TIME
+        stamps = pd.DatetimeIndex(np.where(seen, times, 0).astype('datetime64[ns]'))
+        days = np.where(seen, times, 0) // DAY_NS
+        columns['hour'] = np.where(seen, stamps.hour, -1).astype(np.int8)
+        columns['month'] = np.where(seen, stamps.month, -1).astype(np.int8)
+        columns['is_weekday'] = np.where(seen, stamps.dayofweek < 5, 0).astype(np.int8)
+        columns['is_holiday'] = np.asarray(
+            [int(seen_i and day in _holiday_days(year)) for seen_i, day, year in zip(seen, days, stamps.year)],
+            dtype=np.int8)
+        return pd.DataFrame(columns, index=pd.Index(self.building_ids, name='bldg_id')[slots])
@@ -0,0 +1,243 @@
+"""persistence
+
+Vectorized fleet-wide persistence forecaster.
+
+Loads for many buildings are packed into a (buildings x days x 96) float32
+array, and every persistence variant is computed for every building and every
+day in one array operation:
+    - naive:   tomorrow looks like today (the prior 24 hours)
+    - workday: tomorrow looks like the most recent day of the same kind
+               (workday vs. weekend/holiday)
+    - weekly:  tomorrow looks like the same weekday last week
+
+Days without enough history to forecast are NaN.
+"""
+
+import numpy as np
+
+STEPS_PER_DAY = 96
+LOAD_COLUMN = 'out.electricity.total.energy_consumption'
+
+
+def stack_daily(loads, steps_per_day=STEPS_PER_DAY):
+    """
+    Packs 15-minute load series into a (buildings x days x steps_per_day) array.
+
+    Series are truncated to the longest whole number of days that all of
+    them share.
+
+    Parameters
+    ----------
+    loads : list of array-like
+        One 1-D load series per building, all starting at the same time.
+    steps_per_day : int
+        Samples per day (96 for 15-minute data).
+
+    Returns
+    -------
+    np.ndarray
+        float32 array of shape (buildings, days, steps_per_day).
+    """
+    n_days = min(len(load) for load in loads) // steps_per_day
+    daily = np.empty((len(loads), n_days, steps_per_day), dtype=np.float32)
+    for i, load in enumerate(loads):
+        daily[i] = np.asarray(load[:n_days * steps_per_day], dtype=np.float32).reshape(n_days, steps_per_day)
+    return daily
+
+
+def load_fleet(building_ids, store, column=LOAD_COLUMN, start=None, end=None):
+    """
+    Reads many buildings from a building_store.BuildingStore into a daily array.
+
+    Parameters
+    ----------
+    building_ids : list
+        A list of building ids.
+    store : building_store.BuildingStore
+        Store to read the load from.
+    column : str
+        Load column to forecast.
+    start, end : str or pd.Timestamp, optional
+        Half-open time range [start, end) to read.
+
+    Returns
+    -------
+    tuple
+        (daily array of shape (buildings, days, 96), datetime64[D] array of the
+        date of each day).
+    """
+    frames = [store.read_load(b, columns=[column], start=start, end=end) for b in building_ids]
+    daily = stack_daily([f[column].to_numpy() for f in frames])
+    first_day = frames[0]['timestamp'].iloc[0].to_datetime64().astype('datetime64[D]')
+    return daily, day_dates(first_day, daily.shape[1])
+
+
+def day_dates(start, n_days):
+    """
+    Returns the datetime64[D] dates of n_days consecutive days from start.
+    """
+    start = np.datetime64(start, 'D')
+    return start + np.arange(n_days)
+
+
+def workday_flags(dates, holidays=None):
+    """
+    Flags workdays (Monday-Friday and not a holiday).
+
+    Parameters
+    ----------
+    dates : array-like of datetime64[D]
+        Dates of each day.
+    holidays : array-like of datetime64[D], optional
+        Holidays to treat as non-workdays.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean array, True for workdays.
+    """
+    holidays = [] if holidays is None else holidays
+    return np.is_busday(np.asarray(dates, dtype='datetime64[D]'), holidays=holidays)
+
+
+def _shift_days(daily, lag):
+    forecast = np.full_like(daily, np.nan)
+    if lag < daily.shape[1]:
+        forecast[:, lag:] = daily[:, :-lag]
+    return forecast
+
+
+def naive_persistence(daily):
+    """
+    Forecasts each day with the prior 24 hours.
+
+    Parameters
+    ----------
+    daily : np.ndarray
+        Array of shape (buildings, days, 96).
+
+    Returns
+    -------
+    np.ndarray
+        Forecast array of the same shape, NaN on the first day.
+    """
+    return _shift_days(daily, 1)
+
+
+def weekly_persistence(daily):
+    """
+    Forecasts each day with the same weekday of the previous week.
+    """
+    return _shift_days(daily, 7)
+
+
+def _last_same_kind(flags):
+    # index of the most recent earlier day whose flag equals this day's flag,
+    # or -1 if there is none; works along the last axis
+    days = np.arange(flags.shape[-1])
+    source = np.full(flags.shape, -1, dtype=np.int64)
+    for kind in (False, True):
+        positions = np.where(flags == kind, days, -1)
+        last = np.maximum.accumulate(positions, axis=-1)
+        previous = np.concatenate([np.full(flags.shape[:-1] + (1,), -1), last[..., :-1]], axis=-1)
+        source = np.where(flags == kind, previous, source)
+    return source
+
+
+def workday_persistence(daily, flags):
+    """
+    Forecasts each day with the most recent earlier day of the same kind.
+
+    A workday is forecast from the last workday and a weekend or holiday from
+    the last weekend day or holiday.
+
+    Parameters
+    ----------
+    daily : np.ndarray
+        Array of shape (buildings, days, 96).
+    flags : np.ndarray
+        Boolean workday flags, shape (days,) shared by all buildings or
+        (buildings, days).
+
+    Returns
+    -------
+    np.ndarray
+        Forecast array of the same shape as daily, NaN where there is no
+        earlier day of the same kind.
+    """
+    flags = np.broadcast_to(np.asarray(flags, dtype=bool), daily.shape[:2])
+    source = _last_same_kind(flags)
+    forecast = np.take_along_axis(daily, np.maximum(source, 0)[..., None], axis=1)
+    forecast[source < 0] = np.nan
+    return forecast
+
+
+def forecast_all(daily, dates, holidays=None):
+    """
+    Runs every persistence variant over the whole fleet.
+
+    Parameters
+    ----------
+    daily : np.ndarray
+        Array of shape (buildings, days, 96).
+    dates : array-like of datetime64[D]
+        Date of each day.
+    holidays : array-like of datetime64[D], optional
+        Holidays for the workday-aware variant.
+
+    Returns
+    -------
+    dict
+        {'naive': array, 'workday': array, 'weekly': array}, each shaped like daily.
+    """
+    return {
+        'naive': naive_persistence(daily),
+        'workday': workday_persistence(daily, workday_flags(dates, holidays)),
+        'weekly': weekly_persistence(daily),
+    }
+
+
+def smape(actual, predicted, axis=None):
+    """
+    Calculate SMAPE (Symmetric Mean Absolute Percentage Error) between actual and predicted values.
+
+    Same definition as the model notebooks (0/0 counts as 0), but vectorized
+    along any axis and ignoring NaN forecasts.
+
+    Parameters
+    ----------
+    actual, predicted : array-like
+        Arrays of the same shape.
+    axis : int or tuple, optional
+        Axis to average over. Averages over everything by default.
+
+    Returns
+    -------
+    float or np.ndarray
+    """
+    actual, predicted = np.asarray(actual, dtype=np.float64), np.asarray(predicted, dtype=np.float64)
+    denominator = np.abs(actual) + np.abs(predicted)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        diff = np.abs(actual - predicted) / denominator
+    diff = np.where(denominator == 0, 0.0, diff)
+    diff = np.where(np.isnan(predicted) | np.isnan(actual), np.nan, diff)
+    return 200 * np.nanmean(diff, axis=axis)
+
+
+def score_fleet(daily, forecasts):
+    """
+    Returns the per-building SMAPE of each forecast.
+
+    Parameters
+    ----------
+    daily : np.ndarray
+        Actual loads, shape (buildings, days, 96).
+    forecasts : dict
+        Output of forecast_all.
+
+    Returns
+    -------
+    dict
+        {method: array of shape (buildings,)}.
+    """
+    return {method: smape(daily, forecast, axis=(1, 2)) for method, forecast in forecasts.items()}
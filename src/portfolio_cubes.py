@@ -0,0 +1,336 @@
+"""portfolio_cubes
+
+Precomputed portfolio aggregation cubes.
+
+Buildings are grouped into segments by (in.cluster_name,
+in.comstock_building_type, in.heating_fuel), the slices used in
+ananya/fermata_code_final.py. For every segment the cubes hold, per
+(day x 15-minute slot):
+    - load sum and count of buildings with a reading
+    - peak: the largest single-building reading
+    - a histogram of building readings over log-spaced load bins, from which
+      approximate percentiles are read
+
+Adding buildings only adds into their segment's arrays, so cubes are updated
+incrementally and a building is never counted twice. Portfolio load curves,
+peak hours and percentiles for any filter on the three dimensions are then
+sums over a handful of segment arrays instead of a scan of the fleet.
+
+ComStock timestamps mark the end of their 15-minute interval, so peak_hours
+groups the readings stamped 00:15, 00:30, 00:45 and 01:00 into the hour
+starting at 00:00: the hour the energy was used in. This differs on purpose
+from the calendar-hour groups of rollups.py and online_features.py (readings
+stamped 00:00 to 00:45), which are model features aligned with the
+timestamps, not energy accounting.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STEPS_PER_DAY = 96
+STEPS_PER_HOUR = 4
+STEP = pd.Timedelta(minutes=15)
+DIMENSIONS = ['in.cluster_name', 'in.comstock_building_type', 'in.heating_fuel']
+# log-spaced histogram edges (kWh per interval) for the percentile cubes
+BIN_EDGES = np.concatenate([[0.], np.logspace(-2, 5, 31)])
+
+
+def segment_keys(md, building_ids, dimensions=DIMENSIONS):
+    """
+    Returns the segment key of each building from the raw metadata.
+
+    Parameters
+    ----------
+    md : pd.DataFrame
+        Metadata with 'bldg_id' and the dimension columns (metadata.csv).
+    building_ids : list
+        Buildings to look up.
+
+    Returns
+    -------
+    list of tuple
+        One key per building (None for buildings without metadata).
+    """
+    labels = md.assign(bldg_id=md['bldg_id'].astype(str)).set_index('bldg_id')[dimensions].astype(str)
+    keys = dict(zip(labels.index, labels.itertuples(index=False, name=None)))
+    return [keys.get(str(b).split('.')[0]) for b in building_ids]
+
+
+class PortfolioCubes():
+    """
+    Load-sum, count, peak and histogram cubes per segment.
+
+    Parameters
+    ----------
+    start : str or pd.Timestamp
+        Timestamp of interval 0 (the first 15-minute reading of the year), on
+        the 15-minute grid.
+    n_intervals : int
+        Intervals per building.
+    dimensions : list
+        Metadata columns that define a segment.
+    bin_edges : np.ndarray
+        Histogram edges for the percentile cubes. Histogram counts are
+        uint16, so one segment holds at most 65535 buildings.
+    """
+    def __init__(self, start='2018-01-01 00:15', n_intervals=35040, dimensions=DIMENSIONS,
+                 bin_edges=BIN_EDGES):
+        self.start = pd.Timestamp(start)
+        if self.start != self.start.floor('15min'):
+            raise ValueError(f"start {self.start} is not on the 15-minute grid.")
+        self.n_intervals = n_intervals
+        self.n_days = -(-n_intervals // STEPS_PER_DAY)
+        self.dimensions = list(dimensions)
+        self.bin_edges = np.asarray(bin_edges, dtype=np.float64)
+        self.segments = []          # segment keys, in code order
+        self.code_of = {}
+        self.building_ids = set()
+        self.sums, self.counts, self.peaks, self.histograms = [], [], [], []
+
+    def _shape(self):
+        return (self.n_days, STEPS_PER_DAY)
+
+    def _segment(self, key):
+        code = self.code_of.get(key)
+        if code is None:
+            code = len(self.segments)
+            self.code_of[key] = code
+            self.segments.append(key)
+            self.sums.append(np.zeros(self._shape(), dtype=np.float64))
+            self.counts.append(np.zeros(self._shape(), dtype=np.int32))
+            self.peaks.append(np.full(self._shape(), -np.inf, dtype=np.float32))
+            n_bins = len(self.bin_edges) - 1
+            self.histograms.append(np.zeros((n_bins,) + self._shape(), dtype=np.uint16))
+        return code
+
+    def _grid(self, loads):
+        # (buildings, intervals) -> (buildings, days, slots), padded with NaN
+        grid = np.full((len(loads), self.n_days * STEPS_PER_DAY), np.nan, dtype=np.float64)
+        n = min(loads.shape[1], self.n_intervals)
+        grid[:, :n] = loads[:, :n]
+        return grid.reshape(len(loads), self.n_days, STEPS_PER_DAY)
+
+    # Updates
+    def add_buildings(self, building_ids, loads, keys):
+        """
+        Adds buildings to the cubes; buildings already added are skipped.
+
+        Parameters
+        ----------
+        building_ids : list
+            Buildings to add.
+        loads : np.ndarray
+            Load series of shape (buildings, intervals), e.g.
+            FleetTensor.gather(building_ids, 'out.electricity.total.energy_consumption').
+        keys : list of tuple
+            Segment key of each building, see segment_keys.
+
+        Returns
+        -------
+        int
+            Number of buildings added.
+        """
+        building_ids = [str(b) for b in building_ids]
+        loads = np.asarray(loads)
+        by_segment = {}
+        for i, (building_id, key) in enumerate(zip(building_ids, keys)):
+            if key is None or building_id in self.building_ids:
+                continue
+            self.building_ids.add(building_id)
+            by_segment.setdefault(tuple(key), []).append(i)
+
+        n_bins = len(self.bin_edges) - 1
+        for key, rows in by_segment.items():
+            code = self._segment(key)
+            grid = self._grid(loads[rows])
+            valid = ~np.isnan(grid)
+            self.sums[code] += np.where(valid, grid, 0.).sum(axis=0)
+            self.counts[code] += valid.sum(axis=0, dtype=np.int32)
+            self.peaks[code] = np.maximum(self.peaks[code], np.nanmax(np.where(valid, grid, -np.inf), axis=0))
+            bins = np.clip(np.searchsorted(self.bin_edges, grid, side='right') - 1, 0, n_bins - 1)
+            for b in np.unique(bins[valid]):
+                self.histograms[code][b] += ((bins == b) & valid).sum(axis=0, dtype=np.uint16)
+        return sum(len(rows) for rows in by_segment.values())
+
+    def add_fleet(self, tensor, md, building_ids=None):
+        """
+        Adds the buildings of a fleet_tensor.FleetTensor in chunks.
+
+        The tensor must start at the cubes' start.
+        """
+        from fleet_tensor import CHANNELS
+
+        if tensor.start is not None and tensor.start != self.start:
+            raise ValueError(f"The tensor starts at {tensor.start}, the cubes at {self.start}.")
+
+        building_ids = [b for b, ok in zip(tensor.building_ids, tensor.valid) if ok] \
+            if building_ids is None else [str(b) for b in building_ids]
+        added = 0
+        for i in range(0, len(building_ids), 256):
+            chunk = building_ids[i:i + 256]
+            added += self.add_buildings(chunk, tensor.gather(chunk, CHANNELS[0]), segment_keys(md, chunk))
+        return added
+
+    # Queries
+    def match(self, filters=None):
+        """
+        Returns the segment codes matching {dimension: value or list of values}.
+        """
+        codes = []
+        for code, key in enumerate(self.segments):
+            labels = dict(zip(self.dimensions, key))
+            if all(labels[d] in (v if isinstance(v, (list, tuple, set)) else [v])
+                   for d, v in (filters or {}).items()):
+                codes.append(code)
+        return codes
+
+    def _timestamps(self, first_day, last_day):
+        intervals = np.arange(first_day * STEPS_PER_DAY, last_day * STEPS_PER_DAY)
+        return self.start + intervals * STEP
+
+    def _days(self, first_day, last_day):
+        return slice(first_day, self.n_days if last_day is None else last_day)
+
+    def portfolio_curve(self, filters=None, first_day=0, last_day=None):
+        """
+        Returns the summed load curve and building count of a portfolio.
+
+        Parameters
+        ----------
+        filters : dict, optional
+            {dimension: value or list of values}; None is the whole fleet.
+        first_day, last_day : int
+            Day range (day 0 starts at interval 0), end exclusive.
+
+        Returns
+        -------
+        pd.DataFrame
+            'load' and 'buildings' columns indexed by timestamp.
+        """
+        days = self._days(first_day, last_day)
+        total = np.zeros((days.stop - days.start, STEPS_PER_DAY))
+        count = np.zeros((days.stop - days.start, STEPS_PER_DAY), dtype=np.int64)
+        for code in self.match(filters):
+            total += self.sums[code][days]
+            count += self.counts[code][days]
+        return pd.DataFrame({'load': total.ravel(), 'buildings': count.ravel()},
+                            index=pd.Index(self._timestamps(days.start, days.stop), name='timestamp'))
+
+    def peak_hours(self, filters=None, top=10, first_day=0, last_day=None):
+        """
+        Returns the top hours of the portfolio by summed hourly energy.
+
+        A reading belongs to the hour its interval ends in (see the module
+        docstring); hours not fully inside the day range are left out.
+
+        Returns
+        -------
+        pd.DataFrame
+            'load' column indexed by hour start, largest first.
+        """
+        curve = self.portfolio_curve(filters, first_day, last_day)
+        hour_of = (curve.index - STEP).floor('h')
+        grouped = curve['load'].groupby(hour_of)
+        hourly = grouped.sum()[grouped.size() == STEPS_PER_HOUR]
+        top = min(top, len(hourly))
+        best = np.argsort(-hourly.to_numpy(), kind='stable')[:top]
+        return pd.DataFrame({'load': hourly.to_numpy()[best]}, index=pd.Index(hourly.index[best], name='hour'))
+
+    def peak(self, filters=None, first_day=0, last_day=None):
+        """
+        Returns the largest single-building reading per interval.
+        """
+        days = self._days(first_day, last_day)
+        codes = self.match(filters)
+        peak = np.full((days.stop - days.start, STEPS_PER_DAY), -np.inf, dtype=np.float32)
+        for code in codes:
+            peak = np.maximum(peak, self.peaks[code][days])
+        peak[np.isneginf(peak)] = np.nan
+        return pd.Series(peak.ravel(), index=pd.Index(self._timestamps(days.start, days.stop), name='timestamp'))
+
+    def percentiles(self, q, filters=None, first_day=0, last_day=None, by_slot=True):
+        """
+        Returns approximate percentiles of building readings from the histograms.
+
+        Parameters
+        ----------
+        q : float or list
+            Percentiles in [0, 100].
+        by_slot : bool
+            If True, one value per 15-minute slot of the day over the day range;
+            otherwise one value over the whole range.
+
+        Returns
+        -------
+        pd.DataFrame
+            One column per percentile, indexed by slot (or a single row).
+        """
+        q = np.atleast_1d(q).astype(np.float64)
+        days = self._days(first_day, last_day)
+        n_bins = len(self.bin_edges) - 1
+        histogram = np.zeros((n_bins, STEPS_PER_DAY), dtype=np.int64)
+        for code in self.match(filters):
+            histogram += self.histograms[code][:, days].sum(axis=1, dtype=np.int64)
+        if not by_slot:
+            histogram = histogram.sum(axis=1, keepdims=True)
+
+        # linear interpolation inside the bin that crosses each rank
+        cumulative = np.cumsum(histogram, axis=0)
+        total = cumulative[-1]
+        values = np.full((histogram.shape[1], len(q)), np.nan)
+        for j, p in enumerate(q):
+            rank = p / 100. * total
+            b = np.minimum((cumulative < rank[None]).sum(axis=0), n_bins - 1)
+            below = np.where(b > 0, cumulative[np.maximum(b - 1, 0), np.arange(len(b))], 0)
+            in_bin = histogram[b, np.arange(len(b))]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                fraction = np.clip(np.where(in_bin > 0, (rank - below) / in_bin, 0.), 0., 1.)
+            lower, upper = self.bin_edges[b], self.bin_edges[b + 1]
+            values[:, j] = np.where(total > 0, lower + fraction * (upper - lower), np.nan)
+        index = pd.RangeIndex(histogram.shape[1], name='slot') if by_slot else None
+        return pd.DataFrame(values, columns=[f'p{p:g}' for p in q], index=index)
+
+    def segment_table(self):
+        """
+        Returns one row per segment with its building count.
+        """
+        table = pd.DataFrame(self.segments, columns=self.dimensions)
+        table['buildings'] = [int(c.max()) if c.size else 0 for c in self.counts]
+        return table
+
+    # Persistence
+    def save(self, path):
+        """
+        Writes the cubes to path.npz and path.json.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        arrays = {}
+        for code in range(len(self.segments)):
+            arrays[f'sum_{code}'] = self.sums[code]
+            arrays[f'count_{code}'] = self.counts[code]
+            arrays[f'peak_{code}'] = self.peaks[code]
+            arrays[f'histogram_{code}'] = self.histograms[code]
+        np.savez(path + ".npz", bin_edges=self.bin_edges, **arrays)
+        with open(path + ".json", 'w') as f:
+            json.dump({'start': str(self.start), 'n_intervals': self.n_intervals,
+                       'dimensions': self.dimensions, 'segments': [list(k) for k in self.segments],
+                       'building_ids': sorted(self.building_ids)}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path + ".json", 'r') as f:
+            index = json.load(f)
+        arrays = np.load(path + ".npz")
+        cubes = cls(index['start'], index['n_intervals'], index['dimensions'], arrays['bin_edges'])
+        for code, key in enumerate(index['segments']):
+            cubes.code_of[tuple(key)] = code
+            cubes.segments.append(tuple(key))
+            cubes.sums.append(arrays[f'sum_{code}'])
+            cubes.counts.append(arrays[f'count_{code}'])
+            cubes.peaks.append(arrays[f'peak_{code}'])
+            cubes.histograms.append(arrays[f'histogram_{code}'])
+        cubes.building_ids = set(index['building_ids'])
+        return cubes
@@ -0,0 +1,167 @@
+"""rollups
+
+Hourly and daily rollup features on the regular 15-minute grid.
+
+Replaces the three groupby(['hour', 'day', 'month', 'year']).transform passes
+of Utils.max_min_load_temp. The samples are placed on a day-aligned 15-minute
+grid, so every hour is a row of 4 slots and every day a row of 96 slots, and
+max/min/mean/std of load and temperature for both periods come out of one
+reshape. The results are broadcast back to the original rows by grid position.
+
+Irregular timestamps are handled explicitly:
+    - gaps are empty (NaN) grid slots and the statistics ignore them; the
+      'samples_hourly' column counts the valid load samples in each hour
+    - timestamps off the 15-minute grid raise a ValueError
+    - repeated timestamps (e.g. the DST fall-back hour in local time) raise a
+      ValueError unless duplicates='mean' or 'first' is passed
+    - timezone-aware timestamps are gridded in UTC, which has no DST
+      transitions; daily rollups then follow UTC days
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+LOAD_COLUMN = 'out.electricity.total.energy_consumption'
+TEMPERATURE_COLUMN = 'Dry Bulb Temperature [°C]'
+
+STEPS_PER_HOUR = 4
+STEPS_PER_DAY = 96
+STEP = pd.Timedelta(minutes=15)
+
+STATS = ('max', 'min', 'mean', 'std')
+
+
+def grid_positions(timestamps):
+    """
+    Maps timestamps to slots of a day-aligned 15-minute grid.
+
+    Parameters
+    ----------
+    timestamps : array-like of datetime64
+        Sample timestamps, in any order.
+
+    Returns
+    -------
+    tuple
+        (positions as an int64 array, number of slots in the grid, first
+        timestamp of the grid).
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert('UTC').tz_localize(None)
+    if timestamps.hasnans:
+        raise ValueError("Timestamps contain missing values.")
+
+    grid_start = timestamps.min().floor('D')
+    offsets = timestamps - grid_start
+    positions = offsets // STEP
+    if (offsets % STEP != pd.Timedelta(0)).any():
+        raise ValueError("Timestamps are not on the 15-minute grid.")
+
+    positions = np.asarray(positions, dtype=np.int64)
+    n_days = positions.max() // STEPS_PER_DAY + 1
+    return positions, n_days * STEPS_PER_DAY, grid_start
+
+
+def _place(positions, n_slots, values, duplicates):
+    # scatter values into the grid, resolving repeated slots as requested
+    grid = np.full((n_slots, values.shape[1]), np.nan, dtype=np.float64)
+    counts = np.bincount(positions, minlength=n_slots)
+    if counts.max() <= 1:
+        grid[positions] = values
+        return grid
+
+    if duplicates == 'raise':
+        repeated = np.flatnonzero(counts > 1)
+        raise ValueError(f"{len(repeated)} timestamps are repeated (e.g. a DST fall-back hour); "
+                         "pass duplicates='mean' or 'first' to resolve them.")
+    if duplicates == 'first':
+        # reversed assignment leaves the first occurrence in each slot
+        grid[positions[::-1]] = values[::-1]
+        return grid
+    if duplicates == 'mean':
+        valid = ~np.isnan(values)
+        sums = np.zeros_like(grid)
+        n = np.zeros_like(grid)
+        for c in range(values.shape[1]):
+            sums[:, c] = np.bincount(positions, weights=np.where(valid[:, c], values[:, c], 0.), minlength=n_slots)
+            n[:, c] = np.bincount(positions, weights=valid[:, c], minlength=n_slots)
+        with np.errstate(invalid='ignore'):
+            return np.where(n > 0, sums / n, np.nan)
+    raise ValueError(f"Unknown duplicates policy: {duplicates}")
+
+
+def _stats(blocks):
+    # blocks: (periods, steps, channels) -> {stat: (periods, channels)}
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return {
+            'max': np.nanmax(blocks, axis=1),
+            'min': np.nanmin(blocks, axis=1),
+            'mean': np.nanmean(blocks, axis=1),
+            'std': np.nanstd(blocks, axis=1, ddof=1),
+        }
+
+
+def rollup_features(timestamps, load, temperature, duplicates='raise'):
+    """
+    Computes hourly and daily max/min/mean/std of load and temperature.
+
+    Parameters
+    ----------
+    timestamps : array-like of datetime64
+        Timestamp of each row.
+    load, temperature : array-like
+        Load and temperature of each row.
+    duplicates : str
+        What to do with repeated timestamps: 'raise', 'mean' or 'first'.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per input row (same order) with the columns
+        '{stat}_{load|temp}_{hourly|daily}' for stat in max, min, mean, std,
+        plus 'samples_hourly'.
+    """
+    positions, n_slots, _ = grid_positions(timestamps)
+    values = np.column_stack([np.asarray(load, dtype=np.float64),
+                              np.asarray(temperature, dtype=np.float64)])
+    grid = _place(positions, n_slots, values, duplicates)
+
+    hour_of_row = positions // STEPS_PER_HOUR
+    day_of_row = positions // STEPS_PER_DAY
+    features = {}
+    for period, steps, row_index in (('hourly', STEPS_PER_HOUR, hour_of_row),
+                                     ('daily', STEPS_PER_DAY, day_of_row)):
+        stats = _stats(grid.reshape(-1, steps, 2))
+        for stat in STATS:
+            features[f'{stat}_load_{period}'] = stats[stat][row_index, 0].astype(np.float32)
+            features[f'{stat}_temp_{period}'] = stats[stat][row_index, 1].astype(np.float32)
+
+    samples = (~np.isnan(grid[:, 0])).reshape(-1, STEPS_PER_HOUR).sum(axis=1)
+    features['samples_hourly'] = samples[hour_of_row].astype(np.int8)
+    return pd.DataFrame(features)
+
+
+def add_rollup_features(df, time_column='timestamp', load_column=LOAD_COLUMN,
+                        temperature_column=TEMPERATURE_COLUMN, duplicates='raise'):
+    """
+    Adds the rollup features of rollup_features to a merged weather/load frame.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame with a timestamp column (or a DatetimeIndex if time_column is None),
+        a load column and a temperature column.
+
+    Returns
+    -------
+    pd.DataFrame
+        A copy of df with the rollup columns added.
+    """
+    timestamps = df.index if time_column is None else df[time_column]
+    features = rollup_features(timestamps, df[load_column], df[temperature_column], duplicates)
+    features.index = df.index
+    return pd.concat([df, features], axis=1)
@@ -0,0 +1,157 @@
+"""spectral
+
+Batched real-FFT spectral feature stage.
+
+Year-long 15-minute load series of many buildings are stacked into one
+(buildings x samples) matrix and transformed with a single rfft along the
+time axis. The strongest frequencies are selected with argpartition (no full
+sort), and each building is summarised as a compact float32 row:
+    - period_hours_i, amplitude_i, phase_i for the top-k frequencies
+      (strongest first, DC excluded)
+    - daily_energy_ratio: share of the non-DC spectral energy at the daily
+      frequency and its first harmonics (24h, 12h, 8h, 6h)
+    - weekly_energy_ratio: share at the weekly frequency and its harmonics that
+      are not also daily harmonics (7 days, 3.5 days, ...)
+    - mean_load: the DC term
+"""
+
+import numpy as np
+import pandas as pd
+
+SAMPLE_HOURS = 0.25  # 15-minute samples
+DAILY_HARMONICS = 4
+WEEKLY_HARMONICS = 6
+
+
+def stack_loads(loads):
+    """
+    Stacks load series into a float64 matrix, truncated to the shortest series.
+
+    NaNs are replaced with the series mean so they do not leak into every bin.
+    """
+    n = min(len(load) for load in loads)
+    matrix = np.empty((len(loads), n), dtype=np.float64)
+    for i, load in enumerate(loads):
+        matrix[i] = np.asarray(load[:n], dtype=np.float64)
+    nan_rows = np.isnan(matrix).any(axis=1)
+    if nan_rows.any():
+        means = np.nanmean(matrix[nan_rows], axis=1, keepdims=True)
+        matrix[nan_rows] = np.where(np.isnan(matrix[nan_rows]), means, matrix[nan_rows])
+    return matrix
+
+
+def top_k_bins(magnitudes, k):
+    """
+    Returns the indices of the k largest non-DC bins of each row, strongest first.
+
+    Parameters
+    ----------
+    magnitudes : np.ndarray
+        Array of shape (buildings, bins).
+    k : int
+        Number of bins to keep.
+
+    Returns
+    -------
+    np.ndarray
+        int64 array of shape (buildings, k).
+    """
+    ac = magnitudes[:, 1:]
+    k = min(k, ac.shape[1])
+    top = np.argpartition(ac, -k, axis=1)[:, -k:]
+    # order only the k winners
+    order = np.argsort(-np.take_along_axis(ac, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1) + 1
+
+
+def _harmonic_bins(n, period_hours, harmonics, sample_hours, exclude_period_hours=None):
+    base = n * sample_hours / period_hours
+    bins = []
+    for h in range(1, harmonics + 1):
+        if exclude_period_hours is not None:
+            # skip harmonics that coincide with the excluded cycle
+            ratio = h * exclude_period_hours / period_hours
+            if abs(ratio - round(ratio)) < 1e-9:
+                continue
+        b = int(round(h * base))
+        if 0 < b <= n // 2:
+            bins.append(b)
+    return np.unique(np.asarray(bins, dtype=np.int64))
+
+
+def spectral_features(loads, k=5, sample_hours=SAMPLE_HOURS, building_ids=None):
+    """
+    Computes per-building spectral descriptors with one batched rfft.
+
+    Parameters
+    ----------
+    loads : list of array-like or np.ndarray
+        Load series (one per building) or a (buildings x samples) matrix.
+    k : int
+        Number of dominant frequencies to describe.
+    sample_hours : float
+        Sampling interval in hours.
+    building_ids : list, optional
+        Index of the returned table.
+
+    Returns
+    -------
+    pd.DataFrame
+        float32 table with one row per building.
+    """
+    matrix = stack_loads(loads)
+    n = matrix.shape[1]
+    spectrum = np.fft.rfft(matrix, axis=1)
+    magnitudes = np.abs(spectrum)
+    frequencies = np.fft.rfftfreq(n, d=sample_hours)  # cycles per hour
+
+    top = top_k_bins(magnitudes, k)
+    # one-sided amplitude; the Nyquist bin (even n) is not doubled
+    scale = np.where((top == n // 2) & (n % 2 == 0), 1., 2.) / n
+    amplitudes = np.take_along_axis(magnitudes, top, axis=1) * scale
+    phases = np.angle(np.take_along_axis(spectrum, top, axis=1))
+    periods = 1. / frequencies[top]
+
+    energy = magnitudes ** 2
+    ac_energy = energy[:, 1:].sum(axis=1)
+    daily_bins = _harmonic_bins(n, 24., DAILY_HARMONICS, sample_hours)
+    weekly_bins = _harmonic_bins(n, 24. * 7, WEEKLY_HARMONICS, sample_hours, exclude_period_hours=24.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily_ratio = energy[:, daily_bins].sum(axis=1) / ac_energy
+        weekly_ratio = energy[:, weekly_bins].sum(axis=1) / ac_energy
+
+    columns = {}
+    for i in range(top.shape[1]):
+        columns[f'period_hours_{i + 1}'] = periods[:, i]
+        columns[f'amplitude_{i + 1}'] = amplitudes[:, i]
+        columns[f'phase_{i + 1}'] = phases[:, i]
+    columns['daily_energy_ratio'] = daily_ratio
+    columns['weekly_energy_ratio'] = weekly_ratio
+    columns['mean_load'] = spectrum[:, 0].real / n
+    index = None if building_ids is None else pd.Index(building_ids, name='bldg_id')
+    return pd.DataFrame(columns, index=index).astype(np.float32)
+
+
+def reconstruct_top_k(loads, k=5):
+    """
+    Rebuilds each series from its DC term and k strongest frequencies.
+
+    Parameters
+    ----------
+    loads : list of array-like or np.ndarray
+        Load series (one per building) or a (buildings x samples) matrix.
+    k : int
+        Number of frequencies to keep besides DC.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (buildings, samples).
+    """
+    matrix = stack_loads(loads)
+    spectrum = np.fft.rfft(matrix, axis=1)
+    keep = np.concatenate([np.zeros((len(matrix), 1), dtype=np.int64),
+                           top_k_bins(np.abs(spectrum), k)], axis=1)
+    filtered = np.zeros_like(spectrum)
+    np.put_along_axis(filtered, keep, np.take_along_axis(spectrum, keep, axis=1), axis=1)
+    return np.fft.irfft(filtered, n=matrix.shape[1], axis=1)
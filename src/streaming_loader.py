@@ -0,0 +1,387 @@
+"""streaming_loader
+
+Out-of-core streaming training loader over the building split JSON.
+
+Instead of concatenating every building frame in memory, buildings listed in
+`src/data/*_data.json` are read one at a time on a background thread, joined to
+their encoded metadata row, turned into (X, y) rows and pushed through a
+bounded shuffle buffer. Fixed-size shuffled mini-batches come out the other
+end, so the full 31k-building split can be trained on one machine with:
+    - scikit-learn estimators that implement partial_fit (see partial_fit)
+    - XGBoost's external-memory DMatrix (see xgboost_iter)
+
+Each row holds the numeric columns of the processed building frame, the
+shift_1 ... shift_{n_lags} load lags and the building's metadata vector; the
+target is the load at that row.
+
+The load rollups of the processed frame ('{stat}_load_{hourly|daily}' and
+'samples_hourly', see rollups.py) are computed over the whole hour or day the
+row sits in, so they contain the target reading itself and the readings after
+it. They are left out of the features unless keep_load_rollups is set;
+check_target_leak verifies that no feature of a row moves with its target.
+"""
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from lag_features import lag_columns, lag_matrix, target_matrix
+from rollups import STATS, TEMPERATURE_COLUMN, rollup_features
+
+PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
+PROCESSED_PATH = PATH_INTERNAL + "/processed_weather_and_load"
+
+TARGET_COLUMN = 'out.electricity.total.energy_consumption'
+# columns of the processed building files that are not features
+NON_FEATURE_COLUMNS = ['Index', 'timestamp', 'bldg_id']
+# columns written by rollups.rollup_features
+ROLLUP_COLUMNS = [f'{stat}_{channel}_{period}' for stat in STATS for channel in ('load', 'temp')
+                  for period in ('hourly', 'daily')] + ['samples_hourly']
+
+
+def load_rollup_columns(columns):
+    """
+    Returns the rollup columns computed from windows that contain the target.
+
+    These are the '{stat}_load_{hourly|daily}' rollups and 'samples_hourly' of
+    rollups.rollup_features; the temperature rollups only see weather.
+    """
+    return [c for c in columns if '_load_' in c or c == 'samples_hourly']
+
+
+def load_building_ids(json_file_path):
+    """
+    Load train and test building IDs from a split JSON file.
+
+    The '.csv' suffix written by split_buildings.py is stripped.
+
+    Parameters
+    ----------
+    json_file_path : str
+        Path to the JSON file containing building IDs.
+
+    Returns
+    -------
+    tuple
+        Two lists of string building ids, (train, test).
+    """
+    with open(json_file_path, 'r') as file:
+        data = json.load(file)
+    train_bldg_ids = [str(b).split('.')[0] for b in data.get("train_bldg_ids", [])]
+    test_bldg_ids = [str(b).split('.')[0] for b in data.get("test_bldg_ids", [])]
+    return train_bldg_ids, test_bldg_ids
+
+
+def read_processed_building(building_id, directory=PROCESSED_PATH):
+    """
+    Reads one processed_weather_and_load/<bldg_id>.csv file.
+    """
+    return pd.read_csv(os.path.join(directory, f"{building_id}.csv"))
+
+
+def _with_rollups(df, timestamps, target_column):
+    # recompute the rollup columns the frame has from its (changed) load
+    columns = [c for c in df.columns if c in ROLLUP_COLUMNS]
+    if not columns or TEMPERATURE_COLUMN not in df:
+        return df
+    rollups = rollup_features(timestamps, df[target_column], df[TEMPERATURE_COLUMN])
+    df = df.copy()
+    for c in columns:
+        df[c] = rollups[c].to_numpy()
+    return df
+
+
+class MetadataMatrix():
+    """
+    Encoded metadata held as one float32 matrix with an id -> row lookup.
+
+    Parameters
+    ----------
+    md : pd.DataFrame
+        Encoded metadata (e.g. md_one_hot_encoded.csv) with a 'bldg_id' column.
+        Non-numeric columns are dropped.
+    """
+    def __init__(self, md):
+        ids = md['bldg_id'].astype(str).str.strip()
+        numeric = md.drop(columns=['bldg_id']).select_dtypes(include='number')
+        self.columns = list(numeric.columns)
+        self.values = numeric.to_numpy(dtype=np.float32)
+        self.row_of = {b: i for i, b in enumerate(ids)}
+
+    def vector(self, building_id):
+        row = self.row_of.get(str(building_id))
+        if row is None:
+            return None
+        return self.values[row]
+
+
+class StreamingLoader():
+    """
+    Iterable of shuffled (X, y) float32 mini-batches over many buildings.
+
+    Parameters
+    ----------
+    building_ids : list
+        Buildings to stream, e.g. the train ids of load_building_ids.
+    metadata : MetadataMatrix, metadata_store.MetadataStore or pd.DataFrame
+        Encoded metadata to join to every row.
+    batch_size : int
+        Rows per mini-batch (the last batch of an epoch may be smaller).
+    memory_budget_mb : float
+        Size of the shuffle buffer. Larger buffers mix rows from more
+        buildings per batch.
+    read_fn : callable
+        Maps a building id to its processed frame.
+    n_lags : int
+        Number of load lags to add (0 for none).
+    prefetch : int
+        Number of buildings read ahead on the background thread.
+    seed : int
+        Seed of the building order and row shuffling; epoch e uses seed + e.
+    keep_load_rollups : bool
+        Keep the load rollup columns (see load_rollup_columns) as features.
+        They leak the target; only for reproducing the old notebooks.
+    """
+    def __init__(self, building_ids, metadata, batch_size=4096, memory_budget_mb=512,
+                 read_fn=read_processed_building, target_column=TARGET_COLUMN,
+                 n_lags=96, prefetch=4, seed=42, keep_load_rollups=False):
+        self.building_ids = list(building_ids)
+        # anything with vector() and columns works, e.g. a MetadataStore
+        self.metadata = metadata if hasattr(metadata, 'vector') else MetadataMatrix(metadata)
+        self.batch_size = batch_size
+        self.memory_budget_mb = memory_budget_mb
+        self.read_fn = read_fn
+        self.target_column = target_column
+        self.n_lags = n_lags
+        self.prefetch = prefetch
+        self.seed = seed
+        self.keep_load_rollups = keep_load_rollups
+        self.epoch = 0
+        self.frame_columns = None
+        self.skipped = []
+
+    @property
+    def feature_names(self):
+        if self.frame_columns is None:
+            return None
+        return self.frame_columns + lag_columns(self.n_lags) + self.metadata.columns
+
+    def resolve_columns(self, df):
+        """
+        Fixes the frame columns (and their order) from a processed frame.
+
+        Called with the first building read; call it up front to give every
+        worker of a pool the same columns.
+        """
+        numeric = df.drop(columns=NON_FEATURE_COLUMNS + [self.target_column], errors='ignore')
+        columns = list(numeric.select_dtypes(include='number').columns)
+        if not self.keep_load_rollups:
+            leaky = set(load_rollup_columns(columns))
+            columns = [c for c in columns if c not in leaky]
+        self.frame_columns = columns
+        return self.feature_names
+
+    def _frame_rows(self, df, md_vector):
+        # unfiltered rows; row i of X and target is row n_lags + i of df
+        if self.frame_columns is None:
+            self.resolve_columns(df)
+        y = df[self.target_column].to_numpy(dtype=np.float32)
+        frame = df[self.frame_columns].to_numpy(dtype=np.float32)[self.n_lags:]
+        parts = [frame]
+        if self.n_lags:
+            parts.append(lag_matrix(y, self.n_lags, horizon=1))
+        parts.append(np.broadcast_to(md_vector, (len(frame), len(md_vector))))
+        X = np.concatenate(parts, axis=1)
+        target = target_matrix(y, self.n_lags, horizon=1)[:, 0]
+        return X, target
+
+    def building_rows(self, building_id):
+        """
+        Returns the (X, y) rows of one building, or None if it has no data.
+        """
+        df = self.read_fn(building_id)
+        md_vector = self.metadata.vector(building_id)
+        if df is None or self.target_column not in df or md_vector is None:
+            return None
+        X, target = self._frame_rows(df, md_vector)
+        keep = ~(np.isnan(X).any(axis=1) | np.isnan(target))
+        return X[keep], target[keep]
+
+    def check_target_leak(self, building_id, n_checks=5, seed=0):
+        """
+        Checks that no feature of a row depends on the row's target.
+
+        The load at a few random rows t is changed, the rollups of rollups.py
+        are recomputed from the changed load, and the features of rows t and
+        earlier must stay the same (later rows may see it through their lags).
+        Frames without a 'timestamp' column are taken to be a regular
+        15-minute grid starting at 2018-01-01 00:15, as the ComStock files are.
+
+        Returns
+        -------
+        list
+            Names of the features that moved with the target; empty if none.
+        """
+        df = self.read_fn(building_id)
+        md_vector = self.metadata.vector(building_id)
+        if 'timestamp' in df:
+            timestamps = pd.to_datetime(df['timestamp'])
+        else:
+            timestamps = pd.date_range('2018-01-01 00:15', periods=len(df), freq='15min')
+        X, _ = self._frame_rows(_with_rollups(df, timestamps, self.target_column), md_vector)
+        names = np.asarray(self.feature_names)
+        rng = np.random.default_rng(seed)
+        leaky = set()
+        column = df.columns.get_loc(self.target_column)
+        for t in rng.integers(self.n_lags, len(df), n_checks):
+            value = df.iloc[t, column]
+            # raise, lower and drop the reading so max, min and counts all move
+            for changed_value in (abs(value) * 3 + 1, -abs(value) - 1, np.nan):
+                changed = df.copy()
+                changed.iloc[t, column] = changed_value
+                X_changed, _ = self._frame_rows(_with_rollups(changed, timestamps, self.target_column), md_vector)
+                rows = t - self.n_lags + 1
+                moved = ~np.isclose(X[:rows], X_changed[:rows], equal_nan=True).all(axis=0)
+                leaky.update(names[moved].tolist())
+        return sorted(leaky)
+
+    def _produce(self, order, out, stop):
+        try:
+            for building_id in order:
+                if stop.is_set():
+                    return
+                try:
+                    rows = self.building_rows(building_id)
+                except Exception as e:
+                    print(f"Error loading building {building_id}: {e}")
+                    rows = None
+                if rows is None:
+                    self.skipped.append(building_id)
+                    continue
+                out.put(rows)
+            out.put(None)
+        except BaseException as e:
+            out.put(e)
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        self.skipped = []
+        order = [self.building_ids[i] for i in rng.permutation(len(self.building_ids))]
+
+        out = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(order, out, stop), daemon=True)
+        producer.start()
+
+        budget = self.memory_budget_mb * 1024 * 1024
+        buffer_X, buffer_y, buffered = [], [], 0
+        try:
+            while True:
+                item = out.get()
+                if isinstance(item, BaseException):
+                    raise item
+                if item is not None:
+                    X, y = item
+                    buffer_X.append(X)
+                    buffer_y.append(y)
+                    buffered += X.nbytes + y.nbytes
+                    if buffered < budget:
+                        continue
+                if not buffer_X:
+                    break
+
+                X = np.concatenate(buffer_X)
+                y = np.concatenate(buffer_y)
+                perm = rng.permutation(len(y))
+                X, y = X[perm], y[perm]
+                n_full = len(y) // self.batch_size * self.batch_size
+                for start in range(0, n_full, self.batch_size):
+                    yield X[start:start + self.batch_size], y[start:start + self.batch_size]
+
+                # carry the remainder into the next buffer fill
+                buffer_X, buffer_y = [X[n_full:]], [y[n_full:]]
+                buffered = buffer_X[0].nbytes + buffer_y[0].nbytes
+                if item is None:
+                    if n_full < len(y):
+                        yield X[n_full:], y[n_full:]
+                    break
+        finally:
+            stop.set()
+            # unblock the producer if it is waiting on a full queue
+            while producer.is_alive():
+                try:
+                    out.get_nowait()
+                except queue.Empty:
+                    producer.join(timeout=0.1)
+
+
+def partial_fit(estimator, loader, epochs=1, verbose=True):
+    """
+    Trains a scikit-learn estimator that implements partial_fit on a loader.
+
+    Parameters
+    ----------
+    estimator : sklearn estimator
+        E.g. SGDRegressor or MLPRegressor.
+    loader : StreamingLoader
+        Mini-batch source.
+    epochs : int
+        Number of passes over the buildings.
+
+    Returns
+    -------
+    The fitted estimator.
+    """
+    for epoch in range(epochs):
+        n_rows = 0
+        for X, y in loader:
+            estimator.partial_fit(X, y)
+            n_rows += len(y)
+        if verbose:
+            print(f"Epoch {epoch + 1}/{epochs}: {n_rows} rows")
+    return estimator
+
+
+def xgboost_iter(loader, cache_prefix):
+    """
+    Wraps a loader as an xgboost.DataIter for external-memory training.
+
+    Usage: xgboost.DMatrix(xgboost_iter(loader, "/tmp/xgb_cache")).
+
+    Parameters
+    ----------
+    loader : StreamingLoader
+        Mini-batch source.
+    cache_prefix : str
+        Path prefix of XGBoost's on-disk page cache.
+
+    Returns
+    -------
+    xgboost.DataIter
+    """
+    import xgboost
+
+    class LoaderIter(xgboost.DataIter):
+        def __init__(self):
+            self._batches = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._batches is None:
+                self._batches = iter(loader)
+            try:
+                X, y = next(self._batches)
+            except StopIteration:
+                return False
+            input_data(data=X, label=y)
+            return True
+
+        def reset(self):
+            self._batches = None
+
+    return LoaderIter()
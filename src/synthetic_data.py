@@ -0,0 +1,210 @@
+"""synthetic_data
+
+Deterministic generator of a fake ComStock tree for running the pipeline
+outside Colab:
+
+    <root>/metadata.csv
+    <root>/building_data/<bldg_id>/load.csv      15-minute, 'timestamp' 00:15 ... 00:00
+    <root>/building_data/<bldg_id>/weather.csv   hourly, 'date_time'
+
+Column names, category labels and their frequencies follow the real
+metadata (src/preprocessing/md_encoded_categorical.csv). Every building is
+generated from its own seed (seed, bldg_id), so a fleet of 100 is the first
+100 buildings of a fleet of 10k and already generated buildings are not
+rewritten. As in ComStock, buildings of the same cluster share one weather
+file.
+
+Loads are an occupancy schedule per building type, scaled by floor area,
+plus a cooling/heating response to the dry bulb temperature and noise; they
+are not meant to be realistic, only to have the right shape and periodicity.
+
+Usage:
+    generate_fleet("/tmp/comstock", 100)
+    Utils-style code then reads BUILDING_PATH = "/tmp/comstock/building_data".
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+STEPS_PER_DAY = 96
+LOAD_COLUMNS = ['out.electricity.total.energy_consumption',
+                'out.natural_gas.total.energy_consumption',
+                'out.site_energy.total.energy_consumption']
+
+# (cluster, state, iso/rto region, mean temp degC, annual swing, daily swing, mean RH)
+CLIMATE_ZONES = {
+    'Mixed-Humid': (('Atlanta Area', 'GA', 'none', 17., 10., 5., 68.), 0.333),
+    'Cold': (('Chicago Area', 'IL', 'PJM', 10., 14., 5., 70.), 0.299),
+    'Hot-Humid': (('Houston Area', 'TX', 'ERCOT', 21., 8., 5., 75.), 0.212),
+    'Hot-Dry': (('Phoenix Area', 'AZ', 'none', 24., 10., 8., 35.), 0.106),
+    'Marine': (('Portland Area', 'OR', 'none', 12., 7., 5., 75.), 0.034),
+    'Mixed-Dry': (('Albuquerque Area', 'NM', 'none', 14., 11., 8., 40.), 0.009),
+    'Very Cold': (('Minneapolis Area', 'MN', 'MISO', 7., 16., 5., 70.), 0.007),
+}
+# group -> (building types, group share, open hour, close hour, weekend factor)
+BUILDING_TYPES = {
+    'Mercantile': (['RetailStandalone', 'RetailStripmall'], 0.38, 9, 21, 0.9),
+    'Warehouse and Storage': (['Warehouse'], 0.256, 7, 17, 0.4),
+    'Office': (['SmallOffice', 'MediumOffice', 'LargeOffice'], 0.232, 8, 18, 0.3),
+    'Food Service': (['QuickServiceRestaurant', 'FullServiceRestaurant'], 0.078, 10, 22, 1.),
+    'Education': (['PrimarySchool', 'SecondarySchool'], 0.035, 7, 16, 0.2),
+    'Lodging': (['SmallHotel', 'LargeHotel'], 0.018, 0, 24, 1.),
+}
+HEATING_FUELS = (['NaturalGas', 'Electricity', 'Propane', 'FuelOil', 'DistrictHeating'],
+                 [0.604, 0.352, 0.022, 0.014, 0.008])
+LIGHTING = (['gen2_t8_halogen', 'gen4_led', 'gen1_t12_incandescent', 'gen3_t5_cfl'],
+            [0.489, 0.305, 0.159, 0.047])
+VINTAGES = (['Before 1946', '1946 to 1959', '1960 to 1969', '1970 to 1979',
+             '1980 to 1989', '1990 to 1999', '2000 to 2012', '2013 to 2018'],
+            [0.209, 0.132, 0.126, 0.148, 0.143, 0.118, 0.101, 0.023])
+
+
+def _choice(rng, options):
+    values, weights = options
+    weights = np.asarray(weights, dtype=np.float64)
+    return values[rng.choice(len(values), p=weights / weights.sum())]
+
+
+def building_metadata(building_id, seed=0):
+    """
+    Returns the metadata row of one synthetic building as a dict.
+    """
+    rng = np.random.default_rng([seed, int(building_id)])
+    zone = _choice(rng, (list(CLIMATE_ZONES), [share for _, share in CLIMATE_ZONES.values()]))
+    cluster, state, region = CLIMATE_ZONES[zone][0][:3]
+    group = _choice(rng, (list(BUILDING_TYPES), [t[1] for t in BUILDING_TYPES.values()]))
+    building_type = rng.choice(BUILDING_TYPES[group][0])
+    heating_fuel = _choice(rng, HEATING_FUELS)
+    return {
+        'bldg_id': int(building_id),
+        'in.comstock_building_type_group': group,
+        'in.comstock_building_type': str(building_type),
+        'in.building_america_climate_zone': zone,
+        'in.cluster_name': cluster,
+        'in.state': state,
+        'in.iso_rto_region': region,
+        'in.heating_fuel': heating_fuel,
+        'in.service_water_heating_fuel': heating_fuel if rng.random() < 0.8 else _choice(rng, HEATING_FUELS),
+        'in.interior_lighting_generation': _choice(rng, LIGHTING),
+        'in.vintage': _choice(rng, VINTAGES),
+        # log-uniform floor area over the metadata's 1k - 1M sqft range
+        'in.sqft': float(np.round(10 ** rng.uniform(3, 6), -2)),
+    }
+
+
+def weather_frame(cluster, start='2018-01-01', days=365, seed=0):
+    """
+    Returns the hourly weather.csv frame of a cluster.
+    """
+    zone = next(z for z, (params, _) in CLIMATE_ZONES.items() if params[0] == cluster)
+    _, _, _, mean_temp, annual_swing, daily_swing, mean_rh = CLIMATE_ZONES[zone][0]
+    rng = np.random.default_rng([seed, sum(cluster.encode())])
+    hours = np.arange(days * 24)
+    # coldest in mid January, warmest mid afternoon
+    annual = -np.cos(2 * np.pi * (hours / 24. - 15) / 365.)
+    daily = -np.cos(2 * np.pi * (hours % 24 - 3) / 24.)
+    # slowly varying weather systems on top of the seasonal cycle
+    systems = np.convolve(rng.normal(0, 1, len(hours) + 72), np.ones(72) / np.sqrt(72), 'valid')[:len(hours)]
+    temperature = mean_temp + annual_swing * annual + daily_swing * daily + 2.5 * systems
+    humidity = np.clip(mean_rh - 12. * daily + 6. * rng.normal(0, 1, len(hours)), 5., 100.)
+    return pd.DataFrame({
+        'date_time': pd.date_range(pd.Timestamp(start), periods=len(hours), freq='h').strftime('%Y-%m-%d %H:%M:%S'),
+        'Dry Bulb Temperature [°C]': np.round(temperature, 1),
+        'Relative Humidity [%]': np.round(humidity, 0),
+        'Wind Speed [m/s]': np.round(np.abs(3. + 1.5 * rng.normal(0, 1, len(hours))), 1),
+        'Wind Direction [Deg]': np.round(rng.uniform(0, 360, len(hours)), 0),
+        'Global Horizontal Radiation [W/m2]': np.round(np.maximum(0., 600. * daily) * (annual * -0.3 + 0.7), 1),
+    })
+
+
+def load_frame(metadata, weather, start='2018-01-01', days=365, seed=0):
+    """
+    Returns the 15-minute load.csv frame of one building.
+
+    Parameters
+    ----------
+    metadata : dict
+        Row from building_metadata.
+    weather : pd.DataFrame
+        Hourly weather frame of the building's cluster.
+    """
+    rng = np.random.default_rng([seed, metadata['bldg_id'], 1])
+    n = days * STEPS_PER_DAY
+    timestamps = pd.Timestamp(start) + pd.to_timedelta(np.arange(1, n + 1) * 15, unit='min')
+    _, _, open_hour, close_hour, weekend_factor = BUILDING_TYPES[metadata['in.comstock_building_type_group']]
+
+    # each reading covers the 15 minutes ending at its timestamp
+    period_start = timestamps - pd.Timedelta(minutes=15)
+    hour = period_start.hour + period_start.minute / 60.
+    is_open = (hour >= open_hour) & (hour < close_hour)
+    weekday = period_start.dayofweek < 5
+    occupancy = np.where(is_open, np.where(weekday, 1., weekend_factor), 0.) * rng.uniform(0.7, 1.)
+    # hold the hourly temperature for the response
+    temperature = np.repeat(weather['Dry Bulb Temperature [°C]'].to_numpy(), 4)[:n]
+
+    # kWh per 15 minutes per sqft
+    intensity = 2.5e-3 * rng.uniform(0.6, 1.4)
+    base = metadata['in.sqft'] * intensity * (0.35 + 0.65 * occupancy)
+    cooling = np.maximum(temperature - 20., 0.) * 0.04
+    heating = np.maximum(14. - temperature, 0.) * (0.04 if metadata['in.heating_fuel'] == 'Electricity' else 0.005)
+    electricity = base * (1. + cooling + heating) * (1. + 0.05 * rng.normal(0, 1, n))
+    gas = metadata['in.sqft'] * intensity * np.maximum(14. - temperature, 0.) * 0.05 \
+        if metadata['in.heating_fuel'] == 'NaturalGas' else np.zeros(n)
+    electricity = np.maximum(electricity, 0.)
+    return pd.DataFrame({
+        'timestamp': timestamps.strftime('%Y-%m-%d %H:%M:%S'),
+        LOAD_COLUMNS[0]: np.round(electricity, 4),
+        LOAD_COLUMNS[1]: np.round(gas, 4),
+        LOAD_COLUMNS[2]: np.round(electricity + gas, 4),
+    })
+
+
+def generate_fleet(root, n_buildings, seed=0, start='2018-01-01', days=365, first_id=1, verbose=True):
+    """
+    Writes a synthetic ComStock tree with n_buildings buildings.
+
+    Parameters
+    ----------
+    root : str
+        Output folder; gets metadata.csv and building_data/.
+    n_buildings : int
+        Number of buildings, with ids first_id ... first_id + n_buildings - 1.
+    seed : int
+        Seed of the whole fleet.
+    start : str
+        First day of the year.
+    days : int
+        Days per building (365 for a ComStock year).
+
+    Returns
+    -------
+    pd.DataFrame
+        The metadata of the fleet.
+    """
+    building_path = os.path.join(root, 'building_data')
+    os.makedirs(building_path, exist_ok=True)
+    building_ids = range(first_id, first_id + n_buildings)
+    md = pd.DataFrame([building_metadata(b, seed) for b in building_ids])
+
+    weather = {}
+    written = 0
+    for row in md.to_dict('records'):
+        building_dir = os.path.join(building_path, str(row['bldg_id']))
+        load_file = os.path.join(building_dir, 'load.csv')
+        weather_file = os.path.join(building_dir, 'weather.csv')
+        if os.path.exists(load_file) and os.path.exists(weather_file):
+            continue
+        cluster = row['in.cluster_name']
+        if cluster not in weather:
+            weather[cluster] = weather_frame(cluster, start, days, seed)
+        os.makedirs(building_dir, exist_ok=True)
+        weather[cluster].to_csv(weather_file, index=False)
+        load_frame(row, weather[cluster], start, days, seed).to_csv(load_file, index=False)
+        written += 1
+
+    md.to_csv(os.path.join(root, 'metadata.csv'), index=False)
+    if verbose:
+        print(f"Generated {written} buildings ({n_buildings - written} already present) in {building_path}")
+    return md
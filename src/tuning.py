@@ -0,0 +1,412 @@
+"""tuning
+
+Successive-halving / Hyperband hyperparameter search over cached feature
+shards.
+
+Feature rows (the StreamingLoader rows: processed frame columns without the
+load rollups, load lags and the metadata vector) are built once per building
+and cached as <shard_dir>/<bldg_id>.npz, subsampled to a fixed number of rows
+per building. Every trial after that only loads arrays. The feature list is
+kept in <shard_dir>/_features.json; shards of another feature list are rebuilt.
+
+The budget of a trial is the number of training buildings. Training
+buildings are put in a stratified order (round-robin over building type
+groups), so every prefix of the order is a stratified subset and larger rungs
+train on a superset of the buildings of smaller rungs. Each configuration
+starts on min_buildings buildings; only the best 1/eta of a rung move on to
+eta times as many buildings. Trials of a rung run in a process pool and are
+scored by SMAPE (persistence.smape) on the shards of the test split.
+
+Models are given by name ('random_forest', 'xgboost', 'catboost', 'ridge')
+or as a picklable callable mapping a config dict to an estimator.
+"""
+
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from persistence import smape
+from streaming_loader import load_rollup_columns
+
+PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
+SHARD_PATH = PATH_INTERNAL + "/feature_shards"
+
+# search spaces: a list is a choice, a tuple is (kind, low, high) with kind
+# 'int', 'uniform' or 'log'
+SEARCH_SPACES = {
+    'random_forest': {
+        'n_estimators': ('int', 15, 300),
+        'max_depth': ('int', 4, 30),
+        'min_samples_leaf': ('int', 1, 50),
+        'max_features': [1.0, 'sqrt', 0.5],
+    },
+    'xgboost': {
+        'n_estimators': ('int', 50, 800),
+        'max_depth': ('int', 3, 12),
+        'learning_rate': ('log', 0.01, 0.3),
+        'subsample': ('uniform', 0.5, 1.),
+        'colsample_bytree': ('uniform', 0.4, 1.),
+        'min_child_weight': ('log', 1., 50.),
+    },
+    'catboost': {
+        'iterations': ('int', 100, 1000),
+        'depth': ('int', 4, 10),
+        'learning_rate': ('log', 0.01, 0.3),
+        'l2_leaf_reg': ('log', 1., 30.),
+    },
+    'ridge': {
+        'alpha': ('log', 1e-3, 1e3),
+    },
+}
+
+
+def make_model(name, config):
+    """
+    Returns an unfitted estimator of a named model family.
+    """
+    if name == 'random_forest':
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(n_jobs=1, random_state=42, **config)
+    if name == 'xgboost':
+        from xgboost import XGBRegressor
+        return XGBRegressor(n_jobs=1, random_state=42, tree_method='hist', **config)
+    if name == 'catboost':
+        from catboost import CatBoostRegressor
+        return CatBoostRegressor(thread_count=1, random_seed=42, verbose=0, **config)
+    if name == 'ridge':
+        from sklearn.linear_model import Ridge
+        return Ridge(**config)
+    raise ValueError(f"Unknown model {name}")
+
+
+def sample_configs(space, n, seed=42):
+    """
+    Draws n random configurations from a search space.
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n):
+        config = {}
+        for param, domain in space.items():
+            if isinstance(domain, list):
+                config[param] = domain[rng.integers(len(domain))]
+            else:
+                kind, low, high = domain
+                if kind == 'int':
+                    config[param] = int(rng.integers(low, high + 1))
+                elif kind == 'log':
+                    config[param] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+                else:
+                    config[param] = float(rng.uniform(low, high))
+        configs.append(config)
+    return configs
+
+
+def stratified_order(building_ids, groups, seed=42):
+    """
+    Orders buildings so that every prefix is stratified by group.
+
+    Buildings are shuffled within their group and interleaved by their
+    relative position in it, so a prefix of n buildings holds each group in
+    proportion to its size.
+
+    Parameters
+    ----------
+    building_ids : list
+        Buildings to order.
+    groups : dict
+        {bldg_id: group}, e.g. MetadataStore.labels('in.comstock_building_type_group').
+    """
+    rng = np.random.default_rng(seed)
+    groups = {str(k): v for k, v in groups.items()}
+    by_group = {}
+    for b in building_ids:
+        by_group.setdefault(groups.get(str(b)), []).append(b)
+    keyed = []
+    for members in by_group.values():
+        members = [members[i] for i in rng.permutation(len(members))]
+        for rank, b in enumerate(members):
+            keyed.append(((rank + rng.random()) / len(members), b))
+    return [b for _, b in sorted(keyed, key=lambda item: item[0])]
+
+
+# Shards
+_WORKER_LOADER = None
+
+
+def _init_shard_worker(loader):
+    global _WORKER_LOADER
+    _WORKER_LOADER = loader
+
+
+def _build_shard(args):
+    building_id, shard_file, rows_per_building, seed = args
+    try:
+        rows = _WORKER_LOADER.building_rows(building_id)
+        if rows is None:
+            return building_id, None, "no data"
+        X, y = rows
+        if rows_per_building is not None and len(y) > rows_per_building:
+            rng = np.random.default_rng([seed, int(building_id)])
+            keep = np.sort(rng.choice(len(y), rows_per_building, replace=False))
+            X, y = X[keep], y[keep]
+        tmp_file = shard_file + ".tmp.npz"
+        np.savez(tmp_file, X=X, y=y)
+        os.replace(tmp_file, shard_file)
+        return building_id, _WORKER_LOADER.feature_names, None
+    except Exception as e:
+        return building_id, None, f"{type(e).__name__}: {e}"
+
+
+class FeatureShards():
+    """
+    On-disk cache of per-building feature rows.
+
+    Parameters
+    ----------
+    path : str
+        Folder of the <bldg_id>.npz shards.
+    """
+    def __init__(self, path=SHARD_PATH):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, building_id):
+        return os.path.join(self.path, f"{building_id}.npz")
+
+    def has(self, building_id):
+        return os.path.exists(self._file(building_id))
+
+    def build(self, building_ids, loader, rows_per_building=2000, seed=42, max_workers=None, verbose=True):
+        """
+        Builds the shards of the buildings that do not have one yet.
+
+        The loader's feature list is recorded in _features.json. Shards built
+        with a different list (e.g. the old ones with the leaky load rollups)
+        are stale: they are deleted and rebuilt.
+
+        Parameters
+        ----------
+        building_ids : list
+            Buildings to cache (train and test).
+        loader : streaming_loader.StreamingLoader
+            Defines the feature rows (read_fn, metadata, n_lags). It must
+            leave out the load rollups (see streaming_loader.load_rollup_columns).
+        rows_per_building : int or None
+            Rows sampled per building; None keeps them all.
+
+        Returns
+        -------
+        list
+            Buildings whose shard could not be built.
+        """
+        building_ids = [str(b) for b in building_ids]
+        feature_names = self._resolve_features(building_ids, loader)
+        if feature_names is None:
+            if verbose:
+                print(f"None of the {len(building_ids)} buildings could be read; no shards built")
+            return building_ids
+        leaky = load_rollup_columns(feature_names)
+        if leaky:
+            raise ValueError(f"Features {leaky} are computed from windows containing the target.")
+
+        if self.feature_names() != feature_names:
+            stale = [name for name in os.listdir(self.path) if name.endswith('.npz')]
+            for name in stale:
+                os.remove(os.path.join(self.path, name))
+            if verbose and stale:
+                print(f"Removed {len(stale)} shards built with other features")
+            with open(os.path.join(self.path, "_features.json"), 'w') as f:
+                json.dump(feature_names, f)
+
+        todo = [b for b in building_ids if not self.has(b)]
+        jobs = [(b, self._file(b), rows_per_building, seed) for b in todo]
+        failed = []
+        if jobs:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1,
+                                     initializer=_init_shard_worker, initargs=(loader,)) as executor:
+                for building_id, names, error in executor.map(_build_shard, jobs, chunksize=16):
+                    if names is None:
+                        failed.append(building_id)
+                        if verbose:
+                            print(f"Error building shard of {building_id}: {error}")
+        if verbose:
+            print(f"Built {len(todo) - len(failed)} shards ({len(building_ids) - len(todo)} cached, "
+                  f"{len(failed)} failed) in {self.path}")
+        return failed
+
+    @staticmethod
+    def _resolve_features(building_ids, loader):
+        # fix the loader's columns before the pool starts, so every worker
+        # writes rows in the same order and stale shards can be detected
+        if loader.feature_names is not None:
+            return loader.feature_names
+        for building_id in building_ids:
+            try:
+                df = loader.read_fn(building_id)
+            except Exception:
+                continue
+            if df is not None and loader.target_column in df:
+                return loader.resolve_columns(df)
+        return None
+
+    def feature_names(self):
+        try:
+            with open(os.path.join(self.path, "_features.json"), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, building_ids):
+        """
+        Stacks the shards of the given buildings (missing shards are skipped).
+        """
+        X, y = [], []
+        for building_id in building_ids:
+            try:
+                with np.load(self._file(building_id)) as shard:
+                    X.append(shard['X'])
+                    y.append(shard['y'])
+            except FileNotFoundError:
+                continue
+        if not X:
+            raise ValueError("None of the buildings has a feature shard.")
+        return np.concatenate(X), np.concatenate(y)
+
+
+# Trials
+def _run_trial(args):
+    trial_id, model, config, shard_path, train_ids, eval_ids = args
+    record = {'trial_id': trial_id, 'config': config, 'n_buildings': len(train_ids),
+              'n_rows': None, 'smape': None, 'fit_s': None, 'error': None}
+    try:
+        shards = FeatureShards(shard_path)
+        X, y = shards.load(train_ids)
+        record['n_rows'] = len(y)
+        estimator = make_model(model, config) if isinstance(model, str) else model(config)
+        start = time.perf_counter()
+        estimator.fit(X, y)
+        record['fit_s'] = round(time.perf_counter() - start, 3)
+        X_eval, y_eval = shards.load(eval_ids)
+        record['smape'] = float(smape(y_eval, np.asarray(estimator.predict(X_eval), dtype=np.float64)))
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def successive_halving(configs, model, shards, train_order, eval_ids, min_buildings, max_buildings=None,
+                       eta=3, max_workers=None, first_trial_id=0, bracket=0, verbose=True):
+    """
+    Runs one successive-halving bracket.
+
+    Parameters
+    ----------
+    configs : list of dict
+        Configurations of the first rung.
+    model : str or callable
+        Model name (see make_model) or picklable callable config -> estimator.
+    shards : FeatureShards
+        Cached feature rows.
+    train_order : list
+        Training buildings in stratified order (see stratified_order); rung r
+        trains on the first min_buildings * eta ** r of them.
+    eval_ids : list
+        Buildings of the test split the SMAPE is computed on.
+    min_buildings : int
+        Budget of the first rung.
+    max_buildings : int, optional
+        Largest budget; defaults to len(train_order).
+    eta : int
+        Keep 1/eta of the configurations per rung, with eta times the budget.
+
+    Returns
+    -------
+    list of dict
+        One record per trial, with its rung and bracket.
+    """
+    max_buildings = min(max_buildings or len(train_order), len(train_order))
+    records = []
+    survivors = list(enumerate(configs, start=first_trial_id))
+    budget = min_buildings
+    rung = 0
+    while survivors:
+        n_buildings = min(int(round(budget)), max_buildings)
+        jobs = [(trial_id, model, config, shards.path, train_order[:n_buildings], eval_ids)
+                for trial_id, config in survivors]
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+            rung_records = list(executor.map(_run_trial, jobs))
+        for record in rung_records:
+            record.update(rung=rung, bracket=bracket)
+            if verbose and record['error']:
+                print(f"Error in trial {record['trial_id']}: {record['error']}")
+        records += rung_records
+        if verbose:
+            scores = [r['smape'] for r in rung_records if r['smape'] is not None]
+            best = f"{min(scores):.3f}" if scores else "n/a"
+            print(f"bracket {bracket} rung {rung}: {len(survivors)} configs on {n_buildings} buildings, "
+                  f"best SMAPE {best}")
+
+        if n_buildings >= max_buildings or len(survivors) == 1:
+            break
+        scored = sorted((r for r in rung_records if r['smape'] is not None), key=lambda r: r['smape'])
+        keep = max(1, len(survivors) // eta)
+        survivors = [(r['trial_id'], r['config']) for r in scored[:keep]]
+        budget *= eta
+        rung += 1
+    return records
+
+
+def hyperband(model, shards, train_order, eval_ids, space=None, max_buildings=None, min_buildings=8,
+              eta=3, max_workers=None, seed=42, log_path=None, verbose=True):
+    """
+    Runs Hyperband: successive-halving brackets trading configurations for budget.
+
+    Parameters
+    ----------
+    model : str or callable
+        Model name (see make_model) or picklable callable config -> estimator.
+    shards, train_order, eval_ids :
+        See successive_halving.
+    space : dict, optional
+        Search space; defaults to SEARCH_SPACES[model].
+    max_buildings : int, optional
+        Largest budget; defaults to len(train_order).
+    min_buildings : int
+        Smallest budget of any trial.
+    log_path : str, optional
+        JSON lines file every trial record is appended to.
+
+    Returns
+    -------
+    pd.DataFrame
+        All trial records, best SMAPE at the largest budget first.
+    """
+    space = space or SEARCH_SPACES[model]
+    max_buildings = min(max_buildings or len(train_order), len(train_order))
+    s_max = max(0, int(math.floor(math.log(max_buildings / min_buildings, eta) + 1e-9)))
+
+    records = []
+    n_trials = 0
+    for s in range(s_max, -1, -1):
+        n_configs = int(math.ceil((s_max + 1) / (s + 1) * eta ** s))
+        configs = sample_configs(space, n_configs, seed=seed + s)
+        bracket_records = successive_halving(configs, model, shards, train_order, eval_ids,
+                                             min_buildings=max_buildings / eta ** s,
+                                             max_buildings=max_buildings, eta=eta,
+                                             max_workers=max_workers, first_trial_id=n_trials,
+                                             bracket=s_max - s, verbose=verbose)
+        n_trials += n_configs
+        records += bracket_records
+        if log_path is not None:
+            with open(log_path, 'a') as f:
+                for record in bracket_records:
+                    f.write(json.dumps(record) + "\n")
+
+    results = pd.DataFrame(records)
+    return results.sort_values(['n_buildings', 'smape'], ascending=[False, True], na_position='last') \
+        .reset_index(drop=True)
@@ -23,6 +23,8 @@ from metpy.units import units
 import holidays
 import matplotlib.pyplot as plt
 
+from spectral import reconstruct_top_k
+
 # Global Variables
 PATH_EXTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/[EXTERNAL] breakthrough_tech_ai_f24/data"
 PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
@@ -51,20 +53,11 @@ class Utils():
 
     def load_to_fourier(self, df, column='out.electricity.total.energy_consumption', top_n=5):
         """
-        Perform Fourier decomposition on the load data and keep the top N frequencies.
+        Perform Fourier decomposition on the load data and keep the mean and the top N frequencies.
         """
         try:
-            load_fft = fft.fft(df[column].values)
-            frequencies = fft.fftfreq(len(load_fft))
-
-            magnitudes = np.abs(load_fft)
-            indices = np.argsort(magnitudes)[::-1]
-
-            top_indices = indices[:top_n]
-            filtered_fft = np.zeros_like(load_fft)
-            filtered_fft[top_indices] = load_fft[top_indices]
-
-            reconstructed_load = fft.ifft(filtered_fft).real
+            # one-sided real FFT with argpartition top-N selection (spectral.reconstruct_top_k)
+            reconstructed_load = reconstruct_top_k([df[column].values], k=top_n)[0]
             df[f'reconstructed_{column}'] = reconstructed_load
 
             return df
@@ -22,13 +22,18 @@ BUILDING_PATH = PATH_EXTERNAL + "/building_data"
 
 from google.colab import drive
 
+import functools
 import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-import metpy.calc as mpcalc # For calculating heat index.
-from metpy.units import units
+from calendar_features import calendar_features_for
+from fleet_etl import run_fleet_etl
+from instrumentation import StageMetrics, profile_call
+from rollups import add_rollup_features
+from spectral import spectral_features
+from weather_kernel import heat_index # NumPy heat index, matches metpy.calc.heat_index
 
 """
 The Utils class holds common functions that can be used in:
@@ -38,7 +43,15 @@ The Utils class holds common functions that can be used in:
 """
 class Utils():
     # assumes the path is a shortcut in your "MyDrive"
-    def __init__(self, using_colab : True):
+    def __init__(self, using_colab : True, store=None, weather_cache=None, metrics=None):
+        # optional building_store.BuildingStore to read load/weather from
+        # instead of parsing the raw CSV files
+        self.store = store
+        # optional weather_cache.WeatherCache shared by buildings with identical weather.csv
+        self.weather_cache = weather_cache
+        # optional instrumentation.StageMetrics recording per-stage time, memory
+        # and outcome of every building
+        self.metrics = metrics if metrics is not None else StageMetrics(enabled=False)
         if using_colab == False:
             print("Currently does not support local files.")
         else:
@@ -78,39 +91,60 @@ class Utils():
         except Exception as e:
             print(f"Failed to load metadata: {e}")
 
-    # CURRENTLY DOESNT WORK AS EXPECTED
     def max_min_load_temp(self, df):
         """
-        Adds a max load, max temp, min temp to the combined weather/load df.
-        
+        Adds hourly and daily max/min/mean/std of load and temperature to the
+        combined weather/load df (see rollups.rollup_features).
+
         Parameters
         ----------
-        None
-        
+        df : pd.DataFrame
+            Combined weather/load df with a 'timestamp' column.
+
         Returns
         -------
         pd.DataFrame
         """
-        df['max_load_hourly'] = df.groupby(['hour', 'day', 'month', 'year'])['out.electricity.total.energy_consumption'].transform('max')
-        df['max_temp_hourly'] = df.groupby(['hour', 'day', 'month', 'year'])['Dry Bulb Temperature [°C]'].transform('max')
-        df['min_temp_hourly'] = df.groupby(['hour', 'day', 'month', 'year'])['Dry Bulb Temperature [°C]'].transform('min')
-        return df
+        return add_rollup_features(df, 'timestamp')
 
     # Combines the load and weather files that have the same building_id
-    def match_l_and_w_from_building_id(self, building_id):
+    # raise_errors re-raises processing errors (ValueError: bad columns,
+    # off-grid or repeated timestamps) instead of printing them and returning
+    # None, so the parallel ETL records them as failures; missing files still
+    # return None. keep_timestamp keeps the 'timestamp' column, so consumers
+    # such as fleet_tensor.build_fleet_tensor can place rows by time
+    def match_l_and_w_from_building_id(self, building_id, raise_errors=False, keep_timestamp=False):
       # file paths for load.csv and weather.csv
       load_file = os.path.join(BUILDING_PATH, str(building_id), 'load.csv')
       weather_file = os.path.join(BUILDING_PATH,str(building_id), 'weather.csv')
 
       try:
-          # read the load and weather CSV files
-          load_df = pd.read_csv(load_file)
-          weather_df = pd.read_csv(weather_file)
+        with self.metrics.stage('building', building_id) as building:
+          # read the load and weather files, from the columnar store if there is one
+          use_store = self.store is not None and self.store.has_building(building_id)
+          with self.metrics.stage('read_load') as stage:
+              if use_store:
+                  load_df = self.store.read_load(building_id)
+              else:
+                  load_df = pd.read_csv(load_file)
+              stage.rows = len(load_df)
 
           # update load so its encoded
-          load_df = self.convert_column_to_datetime(load_df, 'timestamp').reset_index()
+          with self.metrics.stage('datetime_conversion') as stage:
+              load_df = self.convert_column_to_datetime(load_df, 'timestamp').reset_index()
+              stage.rows = len(load_df)
           # update weather to have interpolation and heat index
-          weather_df = self.w_interpolation_and_heat_index(weather_df)
+          with self.metrics.stage('weather') as stage:
+              if self.weather_cache is not None:
+                  # processed once per distinct weather.csv, shared by every building using it
+                  weather_df = self.weather_cache.get(weather_file, self.w_interpolation_and_heat_index)
+              else:
+                  if use_store:
+                      weather_df = self.store.read_weather(building_id)
+                  else:
+                      weather_df = pd.read_csv(weather_file)
+                  weather_df = self.w_interpolation_and_heat_index(weather_df)
+              stage.rows = len(weather_df)
           # print(weather_df.head())
 
           # # the first few rows and the columns of each DataFrame
@@ -134,7 +168,9 @@ class Utils():
           weather_df = weather_df[['timestamp', 'Dry Bulb Temperature [°C]', 'Relative Humidity [%]', 'heat_index']]
 
           # merge df on the 'timestamp' column
-          merged_df = pd.merge(load_df, weather_df, on='timestamp', how='inner')
+          with self.metrics.stage('merge') as stage:
+              merged_df = pd.merge(load_df, weather_df, on='timestamp', how='inner')
+              stage.rows = len(merged_df)
 
           final_df = merged_df[['timestamp',
                                 'out.electricity.total.energy_consumption',
@@ -142,18 +178,25 @@ class Utils():
                                 'Relative Humidity [%]',
                                 'heat_index']]
           # encode the datetime
-          final_df = self.extract_values_from_datetime(final_df, 'timestamp')
+          with self.metrics.stage('calendar_features') as stage:
+              final_df = self.extract_values_from_datetime(final_df, 'timestamp')
+              stage.rows = len(final_df)
           # find max load and max/min temperature per hour
-          final_df = self.max_min_load_temp(final_df)
-          final_df.drop(columns=['timestamp', 'day', 'year'], inplace=True)
+          with self.metrics.stage('hourly_rollups') as stage:
+              final_df = self.max_min_load_temp(final_df)
+              stage.rows = len(final_df)
+          final_df.drop(columns=['day', 'year'] if keep_timestamp else ['timestamp', 'day', 'year'], inplace=True)
           final_df['bldg_id'] = building_id
           final_df.index.name = 'Index'
+          building.rows = len(final_df)
           return final_df
 
       except FileNotFoundError:
           print(f"Files for building {building_id} not found.")
           return None
       except ValueError as ve:
+          if raise_errors:
+              raise
           print(f"ValueError: {ve}")
           return None
 
@@ -185,6 +228,74 @@ class Utils():
                         print(f"Error saving {building_id}.csv: {e}")
             except Exception as e:
                 print(f"Error processing building_id {building_id}: {e}")
+
+    def save_w_and_l_matches_parallel(self, building_ids, max_workers=None, retry_missing=False):
+        """
+        Parallel, resumable version of save_w_and_l_matches.
+
+        Buildings are processed in a process pool and recorded in
+        processed_weather_and_load/_manifest.jsonl, so rerunning this after an
+        interrupted session skips finished buildings and retries failures.
+        Processing errors (ValueError) are recorded as failed with their
+        message; buildings without files are recorded as missing.
+
+        Parameters
+        ----------
+        building_ids : list
+            A list of building ids.
+        max_workers : int, optional
+            Number of worker processes. Defaults to the number of cores.
+        retry_missing : bool
+            Also retry buildings whose files were not found last time.
+
+        Returns
+        -------
+        fleet_etl.Manifest
+            The manifest of per-building status, checksum, duration and
+            weather cache hits/misses.
+        """
+        process_fn = functools.partial(self.match_l_and_w_from_building_id, raise_errors=True)
+        return run_fleet_etl(building_ids, process_fn,
+                             PATH_INTERNAL + "/processed_weather_and_load",
+                             max_workers=max_workers, retry_missing=retry_missing,
+                             counters_fn=self.etl_counters if self.weather_cache is not None else None)
+
+    def etl_counters(self):
+        """
+        Returns the running weather cache hit/miss counters ({} without a cache).
+
+        Each manifest entry of save_w_and_l_matches_parallel stores how much
+        they grew for its building; Manifest.counter_totals adds them up.
+        """
+        if self.weather_cache is None:
+            return {}
+        return dict(self.weather_cache.stats)
+
+    def profile_building(self, building_id, top=25, prof_path=None):
+        """
+        Runs match_l_and_w_from_building_id for one building under cProfile
+        and tracemalloc (see instrumentation.profile_call) and prints the
+        slowest functions and largest allocation sites.
+
+        Parameters
+        ----------
+        building_id : int
+            The building to profile.
+        top : int
+            Number of functions and allocation sites printed.
+        prof_path : str, optional
+            Also save the raw profile there.
+
+        Returns
+        -------
+        dict
+            The profile_call result; 'result' is the merged DataFrame.
+        """
+        profile = profile_call(self.match_l_and_w_from_building_id, building_id, top=top, prof_path=prof_path)
+        print(profile['profile'])
+        print(f"Peak traced memory: {profile['peak_traced_mb']} MB")
+        print("\n".join(profile['allocations']))
+        return profile
 # Common Categorical Encoding Functions
 
 # Convert column to datetime
@@ -195,6 +306,7 @@ class Utils():
             return df
         except Exception as e:
             print(f"Error converting column to datetime: {e}")
+            self.metrics.fail(e)
 
     # Extract Values from Datetime
     def extract_values_from_datetime(self, df, column_name):
@@ -202,21 +314,16 @@ class Utils():
             if not np.issubdtype(df[column_name].dtype, np.datetime64):
                 df[column_name] = pd.to_datetime(df[column_name])
 
-            # Extract time-based features from the timestamp
-            df['hour'] = df[column_name].dt.hour
-            df['day'] = df[column_name].dt.day # this is removed after the hourly rate is calculated
-            df['month'] = df[column_name].dt.month
-            df['year'] = df[column_name].dt.year
-
-            # Weekday/Weekend binary indicator (1 for weekday, 0 for weekend)
-            df['is_weekday'] = (df[column_name].dt.dayofweek < 5).astype(int)
-
-            # US Holidays binary indicator
-            us_holidays = holidays.US()  # Get a list of US holidays
-            df['is_holiday'] = (df[column_name].dt.date.isin(us_holidays)).astype(int)
+            # Look up hour, day, month, year, weekday and US holiday flags in
+            # the calendar table shared by all buildings ('day' and 'year' are
+            # removed after the hourly rate is calculated)
+            features = calendar_features_for(df[column_name])
+            for feature in ['hour', 'day', 'month', 'year', 'is_weekday', 'is_holiday']:
+                df[feature] = features[feature].values
 
         except Exception as e:
             print(f"Error extracting values from datetime: {e}")
+            self.metrics.fail(e)
 
         return df
 
@@ -225,37 +332,48 @@ class Utils():
         weather = self.convert_column_to_datetime(weather, 'date_time')
         weather = weather.resample('15min').asfreq().interpolate(method='linear').reset_index()
 
-        weather['heat_index'] = mpcalc.heat_index(
-            weather['Dry Bulb Temperature [°C]'].values * units.degC,
-            weather['Relative Humidity [%]'].values * units.percent
-        ).to('degF')
+        # heat index in degF
+        weather['heat_index'] = heat_index(
+            weather['Dry Bulb Temperature [°C]'].values,
+            weather['Relative Humidity [%]'].values
+        )
 
         return weather.rename(columns={"date_time":"timestamp"})
 
 # Common Timeseries Encoding Functions
     # Fourier Encoding on the load.csv
-    def fourier_encoding(self, load):
+    def fourier_encoding(self, load, plot=True):
+      """
+      Returns the spectral descriptors of one building (see
+      spectral.spectral_features) and optionally plots its magnitude spectrum.
+
+      Use spectral.spectral_features directly to encode many buildings at once.
+      """
       load_usage = load['out.electricity.total.energy_consumption'].values
-      fourier_load = np.fft.fft(load_usage)
-      print(fourier_load)
+      features = spectral_features([load_usage])
+      if not plot:
+          return features
+
+      fourier_load = np.fft.rfft(load_usage)
       # Get the corresponding frequencies (assuming uniform 15-minute intervals)
       n = len(load_usage)
       sample_interval = 15 * 60  # 15 minutes in seconds
 
-      frequencies = np.fft.fftfreq(n, d=sample_interval)
+      frequencies = np.fft.rfftfreq(n, d=sample_interval)
       # Get the magnitude and phase of the Fourier transform
       magnitude = np.abs(fourier_load)
       phase = np.angle(fourier_load)
 
       # Plot the magnitude spectrum (ignoring the negative frequencies)
       plt.figure(figsize=(12, 6))
-      plt.plot(frequencies[:n // 2], magnitude[:n // 2])  # Only positive frequencies
+      plt.plot(frequencies, magnitude)  # rfft only returns the non-negative frequencies
       plt.title("Fourier Transform - Magnitude Spectrum")
       plt.xlabel("Frequency (Hz)")
       plt.ylabel("Magnitude")
 
       plt.grid(True)
       plt.show()
+      return features
 
 utils = Utils(using_colab=True)
 utils.remove_lost_l_and_w_from_metadata()
@@ -0,0 +1,140 @@
+"""weather_cache
+
+Content-addressed cache for processed weather frames.
+
+Many ComStock buildings in the same county or cluster ship byte-identical
+weather.csv files. The cache keys the processed 15-minute weather frame (the
+output of Utils.w_interpolation_and_heat_index) by a hash of the raw file, so
+the interpolation and heat index are computed once per distinct file:
+    - memory tier: LRU bounded by number of frames
+    - disk tier: one Parquet file per hash, shared across processes and sessions
+
+Hit/miss statistics show how much of the fleet ETL the cache saves.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+PATH_INTERNAL = "/content/drive/MyDrive/Team-Fermata-Energy/processed_data"
+CACHE_PATH = PATH_INTERNAL + "/weather_cache"
+
+
+def content_hash(path, chunk_size=1 << 20):
+    """
+    Returns the blake2b hex digest of a file's bytes.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WeatherCache():
+    """
+    Two-tier (memory LRU + on-disk) cache of processed weather frames.
+
+    Each worker process of a parallel ETL run (fleet_etl.run_fleet_etl sends
+    the Utils holding the cache to every worker once) keeps its own memory
+    tier for all of its buildings, while all of them share the disk tier.
+    Per-building hits and misses end up in the ETL manifest.
+
+    Parameters
+    ----------
+    cache_path : str or None
+        Folder of the disk tier. None keeps the cache in memory only.
+    max_entries : int
+        Maximum number of frames held in memory.
+    """
+    def __init__(self, cache_path=CACHE_PATH, max_entries=64):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self._frames = OrderedDict()
+        # (path, size, mtime) -> hash, so a file is only hashed once per session
+        self._hashes = {}
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        if cache_path is not None:
+            os.makedirs(cache_path, exist_ok=True)
+
+    def key(self, path):
+        """
+        Returns the content hash of a raw weather file.
+        """
+        st = os.stat(path)
+        file_id = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = self._hashes.get(file_id)
+        if digest is None:
+            digest = content_hash(path)
+            self._hashes[file_id] = digest
+        return digest
+
+    def _disk_file(self, digest):
+        return os.path.join(self.cache_path, f"{digest}.parquet")
+
+    def _remember(self, digest, df):
+        self._frames[digest] = df
+        self._frames.move_to_end(digest)
+        while len(self._frames) > self.max_entries:
+            self._frames.popitem(last=False)
+
+    def get(self, path, process_fn):
+        """
+        Returns the processed weather frame of a raw weather file.
+
+        Parameters
+        ----------
+        path : str
+            Raw weather.csv file.
+        process_fn : callable
+            Maps the raw weather DataFrame to the processed frame, e.g.
+            Utils().w_interpolation_and_heat_index. Only called on a miss.
+
+        Returns
+        -------
+        pd.DataFrame
+            A copy of the cached frame, safe for the caller to modify.
+        """
+        digest = self.key(path)
+
+        df = self._frames.get(digest)
+        if df is not None:
+            self._frames.move_to_end(digest)
+            self.stats['memory_hits'] += 1
+            return df.copy()
+
+        if self.cache_path is not None and os.path.exists(self._disk_file(digest)):
+            df = pd.read_parquet(self._disk_file(digest))
+            self.stats['disk_hits'] += 1
+            self._remember(digest, df)
+            return df.copy()
+
+        self.stats['misses'] += 1
+        df = process_fn(pd.read_csv(path))
+        if self.cache_path is not None:
+            tmp_file = self._disk_file(digest) + f".{os.getpid()}.tmp"
+            df.to_parquet(tmp_file, index=False)
+            os.replace(tmp_file, self._disk_file(digest))
+        self._remember(digest, df)
+        return df.copy()
+
+    def hit_rate(self):
+        lookups = sum(self.stats.values())
+        if lookups == 0:
+            return 0.0
+        return (self.stats['memory_hits'] + self.stats['disk_hits']) / lookups
+
+    def report(self):
+        """
+        Returns the hit/miss statistics and the number of distinct weather files seen.
+
+        Returns
+        -------
+        dict
+        """
+        return {**self.stats,
+                'hit_rate': round(self.hit_rate(), 4),
+                'distinct_files': len(set(self._hashes.values())),
+                'memory_entries': len(self._frames)}
